@@ -7,19 +7,20 @@
 import random
 import sys
 from argparse import ArgumentParser
+from datetime import datetime
 from math import isinf
 from time import sleep
 
 import numpy as np
-import pandas as pd
 
 from snakes.bots import bots
 from snakes.elo import print_tournament_summary
 from snakes.game import Game, RoundType, deserialize, print_event
+from snakes.profiling import Profiler, report_profiles
 from snakes.utils import levenshtein_ratio, Printer
 
 
-def main(snake1, snake2, rate, seed, start):
+def main(snake1, snake2, rate, seed, start, no_state, profile, memory):
     names = [Bot(id=i, grid_size=(1, 1)).name for i, Bot in enumerate(bots)]
 
     name_matches = [levenshtein_ratio(name, snake1) for name in names]
@@ -35,7 +36,8 @@ def main(snake1, snake2, rate, seed, start):
         seed = random.randrange(sys.maxsize)
     random.seed(seed)
 
-    game = Game(agents=agents, round_type=RoundType.TURNS)
+    profiler = Profiler() if profile else None
+    game = Game(agents=agents, round_type=RoundType.TURNS, profiler=profiler, track_memory=memory)
 
     if start:
         grid_size, candies, turn, snakes = deserialize(start)
@@ -44,18 +46,21 @@ def main(snake1, snake2, rate, seed, start):
         game.state.turn = turn
         game.state.snakes = snakes
 
-    printer = Printer()
-    printer.print(game)
-    while True:
-        for event in game.update():
-            agent_names = {id: agent.name for id, agent in game.agents.items()}
-            print_event(event, agent_names)
+    printer = Printer(state=not no_state)
+    try:
         printer.print(game)
-        if not isinf(rate):
-            sleep(1 / rate)
-
-        if game.finished():
-            break
+        while True:
+            for event in game.update():
+                agent_names = {id: agent.name for id, agent in game.agents.items()}
+                print_event(event, agent_names)
+            printer.print(game)
+            if not isinf(rate):
+                sleep(1 / rate)
+
+            if game.finished():
+                break
+    finally:
+        printer.close()
 
     print(f'For a replay of this game run the following command:\n./commandline.py {snake1!r} {snake2!r} --seed {seed}')
     print()
@@ -63,9 +68,18 @@ def main(snake1, snake2, rate, seed, start):
     row['turns'] = game.turns
     row['seed'] = seed
     row.update({'cpu_' + game.agents[i].name: cpu for i, cpu in game.cpu.items()})
+    if memory:
+        row.update({'mem_' + game.agents[i].name: retained for i, retained in game.memory.items()})
+        row.update({'peak_' + game.agents[i].name: peak for i, peak in game.memory_peak.items()})
+
+    import pandas as pd  # imported late, it is slow to import and only needed for the summary
     df = pd.DataFrame([row])
     print_tournament_summary(df, elo=False)
 
+    if profile:
+        print()
+        report_profiles(profiler, f'snakes_{datetime.utcnow().strftime("%Y-%m-%d_%H-%M-%S")}')
+
 
 if __name__ == '__main__':
     parser = ArgumentParser(description='Battle two snakes in the command line')
@@ -74,6 +88,9 @@ if __name__ == '__main__':
     parser.add_argument('-r', '--rate', default=float('inf'), type=float, help="Playback rate (Hz)")
     parser.add_argument('-s', '--seed', type=int, help='Random seed')
     parser.add_argument('--start', help='Start from game state')
+    parser.add_argument('--profile', action='store_true', help='Profile the moves of the bots')
+    parser.add_argument('--memory', action='store_true', help='Record the memory used by the bots')
+    parser.add_argument('--no-state', action='store_true', help='Do not print the game state after every turn')
     args = parser.parse_args()
 
     try:
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from argparse import ArgumentParser
+
+from snakes.replay import REPLAY_FORMATS, ReplayWriter, read_replays
+
+
+def main(infile, outfile, format):
+    n = 0
+    with ReplayWriter(outfile, format=format) as writer:
+        for doc in read_replays(infile):
+            writer.write(doc)
+            n += 1
+    print(f'converted {n} replays to {outfile}')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Convert a replay file to another format')
+    parser.add_argument('infile', help="Input replay file, in any format")
+    parser.add_argument('outfile', help="Output replay file")
+    parser.add_argument('-f', '--format', choices=REPLAY_FORMATS, default='binary', help="Output format")
+    args = parser.parse_args()
+
+    try:
+        main(**vars(args))
+    except KeyboardInterrupt:
+        pass
@@ -6,18 +6,25 @@
 
 from argparse import ArgumentParser, FileType
 
-from snakes.elo import read_csv, print_tournament_summary
+from snakes.elo import ELO_METHODS, read_csv, print_tournament_summary
 
 
-def main(infile):
-    df = read_csv(infile)
-    print_tournament_summary(df)
+def main(infile, method, bootstrap, jobs, chunksize):
+    df = read_csv(infile, chunksize=chunksize)
+    print_tournament_summary(df, method=method, bootstrap=bootstrap, jobs=jobs)
 
 
 if __name__ == '__main__':
     parser = ArgumentParser(description='Elo estimation')
     parser.add_argument('infile', type=FileType(), help="Input csv")
+    parser.add_argument('-m', '--method', choices=ELO_METHODS, default='least_squares', help="Rating estimator")
+    parser.add_argument('-b', '--bootstrap', metavar='N', default=0, type=int,
+                        help="Amount of resamples for confidence intervals")
+    parser.add_argument('-j', '--jobs', type=int, help="Amount of worker processes for the resampling")
+    parser.add_argument('-c', '--chunksize', type=int, help="Read the input in chunks of this many matches")
     args = parser.parse_args()
+    if args.bootstrap and args.chunksize:
+        parser.error('--bootstrap needs all matches in memory, it can not be combined with --chunksize')
 
     try:
         main(**vars(args))
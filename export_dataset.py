@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from argparse import ArgumentParser
+from time import time
+
+from snakes.dataset import export_dataset
+
+
+def main(match, output, jobs, game, grid_size, snakes):
+    start = time()
+    positions = export_dataset(match, output, selection=game, grid_size=grid_size, snakes=snakes,
+                               jobs=jobs if jobs else None)
+    print(f'exported {positions} positions to {output} in {time() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Export the positions of replays as memory-mapped arrays, to train bots')
+    parser.add_argument('match', help="Input match database")
+    parser.add_argument('output', help="Output directory")
+    parser.add_argument('-g', '--game', type=int, nargs='+', help="Index of the replays to export, by default all")
+    parser.add_argument('--grid-size', type=int, nargs=2, metavar=('X', 'Y'),
+                        help="Size of the planes, by default the grid size of the first replay")
+    parser.add_argument('--snakes', type=int, help="Amount of snake planes, by default the most snakes in a replay")
+    parser.add_argument('-j', '--jobs', default=0, type=int)
+    args = parser.parse_args()
+
+    try:
+        main(**vars(args))
+    except KeyboardInterrupt:
+        pass
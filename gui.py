@@ -6,13 +6,15 @@
 
 import random
 from argparse import ArgumentParser
+from datetime import datetime
 
 import pygame
 
-from snakes.window import Window
+from snakes.profiling import Profiler, report_profiles
+from snakes.window import ReplayWindow, Window
 
 
-def main(auto_start, auto_restart, width, height, snake1, snake2, seed):
+def main(auto_start, auto_restart, width, height, snake1, snake2, seed, fps, replay, game, profile):
     pygame.init()
     pygame_display = pygame.display.set_mode((width, height))
     pygame.display.set_caption('Nobleo Snake Battle!')
@@ -20,19 +22,33 @@ def main(auto_start, auto_restart, width, height, snake1, snake2, seed):
     if seed is not None:
         random.seed(seed)
 
-    window = Window(pygame_display, width, height, snake1, snake2)
+    if replay is not None:
+        from snakes.replay import ReplayArchive
+        window = ReplayWindow(pygame_display, width, height, ReplayArchive(replay)[game])
+    else:
+        profiler = Profiler() if profile else None
+        window = Window(pygame_display, width, height, snake1, snake2, profiler=profiler)
 
+    # the game is played in the background, the window is drawn at a fixed frame rate
+    clock = pygame.time.Clock()
     while True:
         for event in pygame.event.get():
             if event.type == pygame.MOUSEBUTTONDOWN:
                 window.handle_click(pygame.mouse.get_pos())
+            elif replay is not None and event.type == pygame.MOUSEMOTION and event.buttons[0]:
+                window.handle_click(event.pos)  # scrubbing through the timeline
+            elif replay is not None and event.type == pygame.KEYDOWN:
+                window.handle_key(event.key)
             elif event.type == pygame.QUIT:
+                window.close()
                 pygame.quit()
+                if profile and replay is None:
+                    report_profiles(profiler, f'snakes_{datetime.utcnow().strftime("%Y-%m-%d_%H-%M-%S")}')
                 return
 
-        window.update()
-        pygame.display.update()
-        window.sleep()
+        # only the parts of the window that changed are updated
+        pygame.display.update(window.update(clock.get_time() / 1000))
+        clock.tick(fps)
 
 
 if __name__ == '__main__':
@@ -48,6 +64,11 @@ if __name__ == '__main__':
     parser.add_argument('--snake1', '-s1', required=False, help="Name of snake 1")
     parser.add_argument('--snake2', '-s2', required=False, help="Name of snake 2")
     parser.add_argument('-s', '--seed', type=int, help='Random seed')
+    parser.add_argument('--fps', type=int, default=60, help='Frame rate of the window')
+    parser.add_argument('--replay', metavar='FILE', help='Watch a replay from this match database instead of playing')
+    parser.add_argument('-g', '--game', type=int, default=0, help='Index of the replay to watch')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the moves of the bots, the report is printed when the window is closed')
     args = parser.parse_args()
 
     try:
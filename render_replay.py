@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from argparse import ArgumentParser
+from time import time
+
+from snakes.replay import ReplayArchive
+from snakes.video import IMAGE_FORMATS, render_frames, render_gif
+
+
+def main(match, output, game, size, format, fps, jobs):
+    doc = ReplayArchive(match)[game]
+    print(f'Rendering replay {game}:', ' vs '.join(doc['agents']))
+    start = time()
+    if output.endswith('.gif'):
+        frames = render_gif(doc, output, size=size, fps=fps, jobs=jobs if jobs else None)
+    else:
+        frames = render_frames(doc, output, size=size, format=format, jobs=jobs if jobs else None)
+    print(f'rendered {frames} frames to {output} in {time() - start:.1f}s')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Render a replay to images or an animated GIF, without a display')
+    parser.add_argument('match', help="Input match database")
+    parser.add_argument('output', help="Output directory for PNG images, or a .gif file")
+    parser.add_argument('-g', '--game', type=int, default=0, help="Index of the replay to render")
+    parser.add_argument('--size', type=int, default=512, help="Width and height of the images in pixels")
+    parser.add_argument('-f', '--format', choices=IMAGE_FORMATS, default='png',
+                        help="Format of the images, tga is the fastest lossless one")
+    parser.add_argument('--fps', type=int, default=20, help="Frames per second of a GIF")
+    parser.add_argument('-j', '--jobs', default=0, type=int)
+    args = parser.parse_args()
+
+    try:
+        main(**vars(args))
+    except KeyboardInterrupt:
+        pass
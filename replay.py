@@ -4,46 +4,179 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
-from argparse import ArgumentParser, FileType
-from typing import Tuple
-
-import yaml
-
-from snakes.game import RoundType, print_event, GameHistory, State
-from snakes.utils import Printer
-
-
-def main(match, compare, seed):
-    for doc in yaml.safe_load_all(match):
-        print('Start replay')
-        history = GameHistory.deserialize(doc)
-        agent_names = {i: name for i, name in enumerate(doc['agents'])}
-        state = State(history.initial_snakes, history.grid_size, RoundType.TURNS, history.initial_candies)
-
-        printer = Printer()
-        printer.print(state)
-        for id_to_move_value in history.history:
-            if isinstance(id_to_move_value, Tuple):
-                state.spawn_candy(*id_to_move_value)
-            else:
-                moves = []
-                for s in state.snakes:
-                    try:
-                        move_value = id_to_move_value[s.id]
-                        moves.append((s, move_value))
-                    except KeyError as e:
-                        pass
-                for event in state.do_moves(moves):
+import random
+from argparse import ArgumentParser
+from collections import defaultdict
+from multiprocessing import Pool
+
+import numpy as np
+
+from snakes.game import print_event, State
+from snakes.replay import ReplayArchive, ReplayReader, position_arguments, position_hash, recorded_positions
+from snakes.utils import Printer, levenshtein_ratio
+
+REPLAYS_PER_CHUNK = 64
+POSITIONS_PER_BATCH = 256
+
+
+def closest_name(name, names):
+    name_matches = [levenshtein_ratio(n, name) for n in names]
+    return names[np.argmax(name_matches)]
+
+
+def main(match, compare, seed, jobs, game, bot, opponent, outcome, no_state):
+    archive = ReplayArchive(match)
+    names = sorted({name for entry in archive.index for name in entry['agents']})
+    if bot is not None:
+        bot = closest_name(bot, names)
+    if opponent is not None:
+        opponent = closest_name(opponent, names)
+
+    selection = game if game else archive.select(bot, opponent, outcome)
+    print(f'Selected {len(selection)} of {len(archive)} replays')
+    if compare is not None:
+        compare_moves(match, selection, compare, seed, jobs)
+        return
+
+    for i in selection:
+        doc = archive[i]
+        print(f'Start replay {i}:', ' vs '.join(doc['agents']))
+        agent_names = {index: name for index, name in enumerate(doc['agents'])}
+        reader = ReplayReader(doc)
+
+        printer = Printer(state=not no_state)
+        try:
+            printer.print(reader.state)
+            for event in reader.all_events():
+                if isinstance(event, State):
+                    printer.print(event)
+                else:
                     print_event(event, agent_names)
-                printer.print(state)
+        finally:
+            printer.close()
+
+
+def compare_moves(match, selection, compare, seed, jobs):
+    """
+    Feed every recorded position to a bot and report how often it agrees with the recorded move
+
+    The replays are re-simulated, and the positions are evaluated, in batches by worker processes. Positions that
+    occur more than once (like the openings) are only evaluated once.
+    """
+    from snakes.bots import bots
+
+    names = [Bot(id=0, grid_size=(1, 1)).name for Bot in bots]
+    compare = closest_name(compare, names)
+    print(f'Comparing the recorded moves with {compare}')
+
+    if jobs == 1:
+        init_worker(match, names.index(compare), seed)
+        map_function = map
+        pool = None
+    else:
+        pool = Pool(jobs if jobs else None, initializer=init_worker, initargs=(match, names.index(compare), seed))
+        map_function = pool.imap
+
+    cache = {}  # position hash -> move of the bot
+    agreement = defaultdict(lambda: [0, 0])  # name of the recorded bot -> (agreed, positions)
+    for start in range(0, len(selection), REPLAYS_PER_CHUNK):
+        chunk = selection[start:start + REPLAYS_PER_CHUNK]
+        recorded = [position for positions in map_function(replay_positions, chunk) for position in positions]
+
+        new = {key: position for key, position, _, _ in recorded if key not in cache}
+        keys = list(new)
+        batches = [[new[key] for key in keys[i:i + POSITIONS_PER_BATCH]]
+                   for i in range(0, len(keys), POSITIONS_PER_BATCH)]
+        moves = [move for batch in map_function(evaluate_positions, batches) for move in batch]
+        cache.update(zip(keys, moves))
+
+        for key, _, name, move in recorded:
+            agreement[name][0] += cache[key] == move
+            agreement[name][1] += 1
+        print(f'Progress: {100 * (start + len(chunk)) / len(selection):.1f}% [{start + len(chunk)} / {len(selection)}]')
+
+    if pool is not None:
+        pool.close()
+
+    print()
+    print(f'{"Recorded bot":20} {"Positions":>10} {"Agreement":>10}')
+    for name, (agreed, total) in sorted(agreement.items(), key=lambda item: -item[1][1]):
+        print(f'{name:20} {total:>10} {agreed / total:>10.1%}')
+    agreed, total = (sum(x) for x in zip(*agreement.values())) if agreement else (0, 0)
+    print(f'{"Total":20} {total:>10} {agreed / total if total else 0:>10.1%}')
+    print(f'{len(cache)} unique positions evaluated')
+
+
+worker_archive = None  # type: ReplayArchive | None
+worker_bot = None
+worker_seed = None
+worker_instances = {}
+
+
+def init_worker(match, bot, seed):
+    global worker_archive, worker_bot, worker_seed
+    from snakes.bots import bots
+
+    worker_archive = ReplayArchive(match)
+    worker_bot = bots[bot]
+    worker_seed = seed
+
+
+def replay_positions(i):
+    """
+    :return: List of (position hash, position, name of the recorded bot, recorded move)
+    """
+    doc = worker_archive[i]
+    return [(position_hash(position), position, doc['agents'][position[2]], move)
+            for position, move in recorded_positions(doc)]
+
+
+def evaluate_positions(positions):
+    return [evaluate_position(position) for position in positions]
+
+
+def evaluate_position(position):
+    """
+    :return: The move of the bot in a position, or None if it raised an exception
+    """
+    grid_size, _, id, _ = position
+    # one instance per snake, since bots find their own snake by id
+    if (id, grid_size) not in worker_instances:
+        worker_instances[id, grid_size] = worker_bot(id=id, grid_size=grid_size)
+    if worker_seed is not None:
+        # seed per position, so the result does not depend on which process evaluates it
+        position_seed = int.from_bytes(position_hash((worker_seed, position))[:4], 'little')
+        random.seed(position_seed)
+        np.random.seed(position_seed)
+    try:
+        return worker_instances[id, grid_size].determine_next_move(**position_arguments(position))
+    except Exception:
+        return None
 
 
 if __name__ == '__main__':
     parser = ArgumentParser(description='Replay a match')
-    parser.add_argument('match', type=FileType('r'), help="Input match database")
-    parser.add_argument('--compare', help="Compare moves with another bot")
-    parser.add_argument('-s', '--seed', type=int, help='Random seed')
+    parser.add_argument('match', help="Input match database")
+    parser.add_argument('-g', '--game', type=int, nargs='+', help="Index of the replays to show")
+    parser.add_argument('--bot', help="Only show replays where this bot played")
+    parser.add_argument('--opponent', help="Only show replays where this bot was an opponent")
+    parser.add_argument('--outcome', choices=['win', 'loss', 'draw'],
+                        help="Only show replays with this outcome for --bot")
+    parser.add_argument('--compare', metavar='BOT',
+                        help="Report how often this bot agrees with the recorded moves, instead of showing the replays")
+    parser.add_argument('-s', '--seed', type=int, help='Random seed for the bot of --compare')
+    parser.add_argument('-j', '--jobs', default=0, type=int, help='Amount of processes for --compare')
+    parser.add_argument('--no-state', action='store_true', help='Do not print the game state after every move')
     args = parser.parse_args()
+    if args.outcome and not args.bot:
+        parser.error('--outcome needs --bot')
+    if args.game and (args.bot or args.opponent or args.outcome):
+        parser.error('--game selects the replays itself, it can not be combined with --bot, --opponent or --outcome')
+    if args.game:
+        size = len(ReplayArchive(args.match))
+        invalid = [i for i in args.game if not 0 <= i < size]
+        if invalid:
+            parser.error(f'--game {" ".join(map(str, invalid))} out of range, the match has {size} replays')
 
     try:
         main(**vars(args))
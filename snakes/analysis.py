@@ -0,0 +1,230 @@
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Board analysis for bots: occupancy, flood fill, distance maps and Voronoi territory
+
+All grids are read-only numpy arrays of the grid size, indexed by [x, y] like the positions of a snake. `analyse`
+builds the occupancy of a position once per bot, and every result is cached on the `BoardAnalysis`, so a bot can ask
+for the same thing as often as it likes during a move::
+
+    def determine_next_move(self, snake, other_snakes, candies):
+        board = analyse(self, snake, other_snakes, candies)
+        area = board.reachable_area(snake[0])
+        ...
+
+Time is counted in moves, assuming that every snake moves once for each move of the own snake and does not grow.
+"""
+
+from typing import List, Tuple
+
+import numpy as np
+
+from .board import read_only
+from .constants import MOVE_VALUE_TO_DIRECTION, MOVES, Move
+from .snake import Snake
+
+DIRECTIONS = np.array([MOVE_VALUE_TO_DIRECTION[move] for move in MOVES])
+
+
+class BoardAnalysis:
+    def __init__(self, grid_size: Tuple[int, int], snakes: List[Snake], candies: List[np.array]):
+        """
+        :param snakes: All snakes on the field, by convention the own snake first
+        """
+        self.grid_size = tuple(grid_size)
+        # copies, snakes are moved in place by the game
+        self.ids = [snake.id for snake in snakes]
+        self.heads = np.array([snake[0] for snake in snakes], dtype=int).reshape(-1, 2)
+        self.candies = np.array(candies, dtype=int).reshape(-1, 2)
+
+        # the owner of every cell, and the amount of moves until it is free, the tail is free after one move
+        positions = np.concatenate([snake.positions for snake in snakes]) if snakes else np.zeros((0, 2), dtype=int)
+        ids = np.repeat(self.ids, [len(snake) for snake in snakes])
+        moves = np.concatenate([np.arange(len(snake), 0, -1) for snake in snakes]) if snakes else ids
+        on_grid = self.on_grid(positions)
+        # sorted, so the last assignment to a cell that is occupied more than once wins, and that one is free last
+        order = np.argsort(moves[on_grid], kind='stable')
+        x, y = positions[on_grid, 0][order], positions[on_grid, 1][order]
+        owner = np.full(self.grid_size, -1, dtype=int)
+        owner[x, y] = ids[on_grid][order]
+        time_to_free = np.zeros(self.grid_size, dtype=int)
+        time_to_free[x, y] = moves[on_grid][order]
+        self.owner = read_only(owner)
+        self.time_to_free = read_only(time_to_free)
+        self.occupied = read_only(owner >= 0)
+        self.heads = read_only(self.heads)
+        self.candies = read_only(self.candies)
+        self.cache = {}
+
+    def cached(self, key, function):
+        """
+        :return: The result of `function`, which is only called once per key. Arrays are made read-only, since they are
+                 shared by every call
+        """
+        if key not in self.cache:
+            result = function()
+            self.cache[key] = read_only(result) if isinstance(result, np.ndarray) else result
+        return self.cache[key]
+
+    def on_grid(self, positions):
+        """
+        :param positions: A position, or an array of positions
+        :return: Whether the positions are on the grid
+        """
+        positions = np.asarray(positions)
+        return np.all((positions >= 0) & (positions < self.grid_size), axis=-1)
+
+    def is_free(self, position) -> bool:
+        """
+        :return: Whether a position is on the grid and not occupied by a snake
+        """
+        return bool(self.on_grid(position)) and not self.occupied[position[0], position[1]]
+
+    def free_moves(self, head=None) -> List[Move]:
+        """
+        :param head: By default the head of the own snake
+        :return: The moves of which the destination is free, in the order of `MOVES`
+        """
+        head = self.heads[0] if head is None else np.asarray(head)
+        targets = head + DIRECTIONS
+        on_grid = self.on_grid(targets)
+        free = on_grid & ~self.occupied[np.where(on_grid, targets[:, 0], 0), np.where(on_grid, targets[:, 1], 0)]
+        return [move for move, is_free in zip(MOVES, free) if is_free]
+
+    # The searches work on bitboards: a Python int with bit x * (height + 1) + y for cell (x, y). A step in every
+    # direction is then a shift by 1 or height + 1, which is much faster than numpy for grids of this size. The bit
+    # after every column is never set, so a step from the top of a column does not end up at the bottom of the next.
+
+    def to_bits(self, mask) -> int:
+        padded = np.zeros((self.grid_size[0], self.grid_size[1] + 1), dtype=bool)
+        padded[:, :-1] = mask
+        return int.from_bytes(np.packbits(padded, bitorder='little').tobytes(), 'little')
+
+    def from_bits(self, bits: int) -> np.ndarray:
+        size = self.grid_size[0] * (self.grid_size[1] + 1)
+        data = np.frombuffer(bits.to_bytes((size + 7) // 8, 'little'), dtype=np.uint8)
+        return np.unpackbits(data, count=size, bitorder='little').reshape(self.grid_size[0], -1)[:, :-1].astype(bool)
+
+    def position_bits(self, positions) -> int:
+        positions = np.array(positions, dtype=int).reshape(-1, 2)
+        bits = 0
+        for x, y in positions[self.on_grid(positions)].tolist():
+            bits |= 1 << (x * (self.grid_size[1] + 1) + y)
+        return bits
+
+    def free_bits(self, moves=0) -> int:
+        """
+        :return: Bitboard of the cells that are free after an amount of moves
+        """
+        return self.cached(('free_bits', moves), lambda: self.to_bits(self.time_to_free <= moves))
+
+    def search(self, sources, wait_for_tails=False):
+        """
+        Breadth-first search from all sources at once
+
+        :return: List of bitboards with the cells at distance 1, 2, ...
+        """
+        stride = self.grid_size[1] + 1
+        visited = self.position_bits(sources)
+        last_free = int(self.time_to_free.max()) if wait_for_tails else 0
+        layers = []
+        while True:
+            free = self.free_bits(min(len(layers) + 1, last_free))
+            reached = visited | visited << 1 | visited >> 1 | visited << stride | visited >> stride
+            layer = reached & free & ~visited
+            if not layer and len(layers) >= last_free:
+                return layers
+            layers.append(layer)
+            visited |= layer
+
+    def flood_fill(self, position) -> np.ndarray:
+        """
+        :param position: Start of the fill, like the head of a snake, which does not need to be free itself
+        :return: Boolean grid of the free cells that can be reached from a position, including the position itself
+        """
+        def fill():
+            reached = self.position_bits(position) & self.free_bits()
+            for layer in self.search([position]):
+                reached |= layer
+            return self.from_bits(reached)
+        return self.cached(('flood_fill', tuple(int(p) for p in position)), fill)
+
+    def reachable_area(self, position) -> int:
+        """
+        :return: The amount of free cells that can be reached from a position
+        """
+        def count():
+            start = self.position_bits(position) & self.free_bits()
+            return sum(bin(layer).count('1') for layer in [start] + self.search([position]))
+        return self.cached(('reachable_area', tuple(int(p) for p in position)), count)
+
+    def distances(self, sources, wait_for_tails=False) -> np.ndarray:
+        """
+        :param sources: Positions at distance 0, like the heads of snakes
+        :param wait_for_tails: Also pass through cells of snakes, from the move in which they become free
+        :return: Grid with the amount of moves to reach every cell from the closest source, -1 if unreachable
+        """
+        sources = np.array(sources, dtype=int).reshape(-1, 2)
+
+        def search():
+            result = np.full(self.grid_size, -1, dtype=int)
+            result[self.from_bits(self.position_bits(sources))] = 0
+            for distance, layer in enumerate(self.search(sources, wait_for_tails), 1):
+                if layer:
+                    result[self.from_bits(layer)] = distance
+            return result
+        return self.cached(('distances', sources.tobytes(), wait_for_tails), search)
+
+    def voronoi(self, heads=None, wait_for_tails=False) -> np.ndarray:
+        """
+        :param heads: Positions to divide the grid between, by default the heads of all snakes
+        :param wait_for_tails: See `distances`
+        :return: Grid with the index in `heads` of the closest head for every cell, -1 for ties and unreachable cells
+        """
+        heads = self.heads if heads is None else heads
+        heads = np.array(heads, dtype=int).reshape(-1, 2)
+
+        def divide():
+            layers = [[self.position_bits(head)] + self.search(head, wait_for_tails) for head in heads]
+            owned = [0] * len(heads)
+            claimed = 0  # cells at a smaller distance of any head
+            for distance in range(max(map(len, layers), default=0)):
+                reached = 0
+                contested = 0
+                new = [head_layers[distance] & ~claimed if distance < len(head_layers) else 0 for head_layers in layers]
+                for cells in new:
+                    contested |= reached & cells
+                    reached |= cells
+                for i, cells in enumerate(new):
+                    owned[i] |= cells & ~contested
+                claimed |= reached
+
+            result = np.full(self.grid_size, -1, dtype=int)
+            for i, cells in enumerate(owned):
+                result[self.from_bits(cells)] = i
+            return result
+        return self.cached(('voronoi', heads.tobytes(), wait_for_tails), divide)
+
+    def territory(self, wait_for_tails=False) -> List[int]:
+        """
+        :return: For every snake, the amount of cells it can reach before any other snake
+        """
+        voronoi = self.voronoi(wait_for_tails=wait_for_tails)
+        return np.bincount(voronoi[voronoi >= 0], minlength=len(self.ids)).tolist()
+
+
+def analyse(bot, snake: Snake, other_snakes: List[Snake], candies: List[np.array]) -> BoardAnalysis:
+    """
+    :param bot: The bot that analyses the position, which keeps the analysis of its last position
+    :return: The `BoardAnalysis` of the arguments of `Bot.determine_next_move`
+    """
+    snakes = [snake] + list(other_snakes)
+    key = (tuple(bot.grid_size), tuple((s.id, s.positions.tobytes()) for s in snakes),
+           np.array(candies, dtype=int).tobytes())
+    last = getattr(bot, '_analysis', None)
+    if last is None or last[0] != key:
+        # only the last position, the analyses of earlier turns are not needed anymore
+        bot._analysis = last = (key, BoardAnalysis(bot.grid_size, snakes, candies))
+    return last[1]
@@ -0,0 +1,162 @@
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from typing import List, Tuple
+
+import numpy as np
+
+from .constants import MOVE_VALUE_TO_DIRECTION, MOVES
+from .snake import Snake
+
+DIRECTIONS = np.array([MOVE_VALUE_TO_DIRECTION[move] for move in MOVES])
+
+
+def read_only(array):
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+class Board:
+    """
+    Read-only view of the field for a `BoardBot`
+
+    The snakes are numbered by their index in `State.snakes`, which is the order in which they move. All bots get the
+    same board, which is updated by the `State` after every move instead of being copied for every bot. Grids are
+    indexed by [x, y] like the positions of a snake.
+    """
+
+    def __init__(self, grid_size: Tuple[int, int], snakes: List[Snake], candies: List[np.array], turns: int = 0):
+        """
+        :param snakes: Snakes in turn order, None for a dead snake
+        """
+        self.grid_size = tuple(grid_size)
+        self._turns = turns
+        self._ids = np.array([-1 if snake is None else snake.id for snake in snakes], dtype=int)
+        self._counts = np.zeros((len(snakes), *self.grid_size), dtype=np.int32)  # a cell can hold a snake twice
+        self._occupancy = np.zeros((len(snakes), *self.grid_size), dtype=bool)
+        self._heads = np.zeros((len(snakes), 2), dtype=int)
+        self._lengths = np.zeros(len(snakes), dtype=int)
+        self._candies = np.zeros(self.grid_size, dtype=bool)
+        self._legal_moves = None
+
+        for index, snake in enumerate(snakes):
+            if snake is None:
+                continue
+            positions = snake.positions[self.on_grid(snake.positions)]
+            np.add.at(self._counts[index], (positions[:, 0], positions[:, 1]), 1)
+            self._heads[index] = snake[0]
+            self._lengths[index] = len(snake)
+        self._occupancy[:] = self._counts > 0
+        for candy in candies:
+            self._candies[candy[0], candy[1]] = True
+
+        self._views = {name: read_only(getattr(self, '_' + name))
+                       for name in ('ids', 'occupancy', 'heads', 'lengths', 'candies')}
+
+    @property
+    def turns(self) -> int:
+        """
+        Amount of turns that have passed
+        """
+        return self._turns
+
+    @property
+    def ids(self) -> np.ndarray:
+        """
+        For every snake its `Snake.id`, -1 if it was dead when the board was made
+        """
+        return self._views['ids']
+
+    @property
+    def occupancy(self) -> np.ndarray:
+        """
+        Boolean planes (snakes, x, y) of the cells that every snake occupies
+        """
+        return self._views['occupancy']
+
+    @property
+    def occupied(self) -> np.ndarray:
+        """
+        Boolean grid of the cells occupied by any snake
+        """
+        return self._occupancy.any(axis=0)
+
+    @property
+    def heads(self) -> np.ndarray:
+        """
+        Positions (snakes, 2) of the heads, the last position for a dead snake
+        """
+        return self._views['heads']
+
+    @property
+    def lengths(self) -> np.ndarray:
+        """
+        For every snake its length, 0 for a dead snake
+        """
+        return self._views['lengths']
+
+    @property
+    def alive(self) -> np.ndarray:
+        return self._lengths > 0
+
+    @property
+    def candies(self) -> np.ndarray:
+        """
+        Boolean grid of the candies
+        """
+        return self._views['candies']
+
+    @property
+    def legal_moves(self) -> np.ndarray:
+        """
+        Boolean array (snakes, moves) of the moves in the order of `MOVES` that stay on the grid and do not run into a
+        snake, all False for a dead snake
+        """
+        if self._legal_moves is None:
+            targets = self._heads[:, None, :] + DIRECTIONS[None]
+            on_grid = self.on_grid(targets)
+            x, y = np.where(on_grid, targets[..., 0], 0), np.where(on_grid, targets[..., 1], 0)
+            legal = on_grid & ~self.occupied[x, y] & self.alive[:, None]
+            self._legal_moves = read_only(legal)
+        return self._legal_moves
+
+    def index(self, id: int) -> int:
+        """
+        :return: The index of the snake with a `Snake.id`
+        """
+        return int(np.flatnonzero(self._ids == id)[0])
+
+    def on_grid(self, positions):
+        return np.all((positions >= 0) & (positions < self.grid_size), axis=-1)
+
+    # the methods below are used by `State` to keep the board up to date
+
+    def move(self, index: int, snake: Snake, tail, grow: bool):
+        """
+        :param snake: The snake after it moved
+        :param tail: The position of the tail before the move
+        """
+        head = snake[0]
+        if self.on_grid(head):
+            self._counts[index, head[0], head[1]] += 1
+            self._occupancy[index, head[0], head[1]] = True
+        if not grow:
+            self._counts[index, tail[0], tail[1]] -= 1
+            self._occupancy[index, tail[0], tail[1]] = self._counts[index, tail[0], tail[1]] > 0
+        self._heads[index] = head
+        self._lengths[index] = len(snake)
+        self._legal_moves = None
+
+    def remove(self, index: int):
+        self._counts[index] = 0
+        self._occupancy[index] = False
+        self._lengths[index] = 0
+        self._legal_moves = None
+
+    def set_candy(self, position, present: bool):
+        self._candies[position[0], position[1]] = present
+
+    def set_turns(self, turns: int):
+        self._turns = turns
@@ -0,0 +1,115 @@
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import warnings
+from math import ceil
+from multiprocessing import Pool
+
+import numpy as np
+
+from .elo import bradley_terry, count_pairs, least_squares_elo, ranked_pairs
+
+
+class Bootstrap:
+    """
+    Resample the matches of a tournament with replacement, to see how much the statistics could vary
+
+    The pairwise comparisons are extracted once. A resample only draws how many times each match occurs, and
+    aggregates the weighted comparisons into win/draw count matrices.
+    """
+
+    def __init__(self, ranking, method='least_squares'):
+        """
+        :param ranking: One row per match, one column per bot with its rank. NaN if the bot did not participate
+        :param method: Rating estimator, see `snakes.elo.ELO_METHODS`. None to only resample the win rates
+        """
+        ranking = np.asarray(ranking, dtype=float)
+        self.matches, self.n = ranking.shape
+        self.method = method
+        self.won = (ranking == 1).astype(float)
+        self.played = (~np.isnan(ranking)).astype(float)
+        self.pairs = ranked_pairs(ranking)
+        self.adjacent_pairs = ranked_pairs(ranking, adjacent=True) if method == 'least_squares' else None
+        # start each fit from the estimate on all matches
+        self.elo = bradley_terry(*count_pairs(self.n, *self.pairs[1:])) if method == 'bradley_terry' else None
+
+    def resample(self, rng):
+        """
+        :return: Elo rating and win rate per bot, and the head-to-head win rate matrix of a single resample. The elo
+                 ratings are NaN without a method
+        """
+        weights = np.bincount(rng.integers(self.matches, size=self.matches), minlength=self.matches)
+
+        match, a, b, score = self.pairs
+        wins, draws = count_pairs(self.n, a, b, score, weights[match])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = (weights @ self.won) / (weights @ self.played)
+            winrate = wins / (wins + wins.T + draws)
+
+        if self.method is None:
+            elo = np.full(self.n, np.nan)
+        elif self.method == 'least_squares':
+            match, a, b, score = self.adjacent_pairs
+            elo = least_squares_elo(*count_pairs(self.n, a, b, score, weights[match]))
+        else:
+            elo = bradley_terry(wins, draws, initial=self.elo)
+        return elo, rate, winrate
+
+    def run(self, samples, seed=None):
+        rng = np.random.default_rng(seed)
+        results = [self.resample(rng) for _ in range(samples)]
+        return tuple(np.array(x) for x in zip(*results))
+
+
+_worker = None  # type: Bootstrap | None
+
+
+def _init_worker(worker):
+    global _worker
+    _worker = worker
+
+
+def _run_worker(args):
+    samples, seed = args
+    return _worker.run(samples, seed)
+
+
+def bootstrap(ranking, samples=1000, method='least_squares', jobs=None, seed=None):
+    """
+    Resample the tournament in parallel
+
+    :param ranking: One row per match, one column per bot with its rank. NaN if the bot did not participate
+    :param samples: Amount of resamples
+    :param method: Rating estimator, see `snakes.elo.ELO_METHODS`. None to skip the rating, when only the win rates
+                   are needed
+    :param jobs: Amount of worker processes, None for one per CPU
+    :param seed: Seed for reproducible results
+    :return: Arrays (elo, rate, winrate) with a row per resample
+    """
+    worker = Bootstrap(ranking, method)
+    if samples <= 0:
+        return np.zeros((0, worker.n)), np.zeros((0, worker.n)), np.zeros((0, worker.n, worker.n))
+
+    # fixed size chunks, so that a seed gives the same result regardless of the amount of processes
+    chunks = np.array_split(np.arange(samples), ceil(samples / 25))
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    tasks = [(len(chunk), s) for chunk, s in zip(chunks, seeds)]
+
+    if jobs == 1:
+        results = [worker.run(*task) for task in tasks]
+    else:
+        with Pool(jobs, initializer=_init_worker, initargs=(worker,)) as pool:
+            results = pool.map(_run_worker, tasks)
+    return tuple(np.concatenate(x) for x in zip(*results))
+
+
+def confidence_interval(samples, confidence=0.95):
+    """
+    Percentile interval over the first axis of the resampled statistics
+
+    :return: Arrays (low, high)
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # statistics of bots that never played are NaN
+        return np.nanpercentile(samples, [50 * (1 - confidence), 50 * (1 + confidence)], axis=0)
@@ -7,6 +7,7 @@ from typing import List, Tuple
 
 import numpy as np
 
+from .board import Board
 from .constants import Move
 from .snake import Snake
 
@@ -53,3 +54,28 @@ class Bot(ABC):
         :return: The move you want to make
         """
         pass
+
+
+class BoardBot(Bot):
+    """
+    A Bot that gets a `Board` instead of copies of the snakes and candies. Inherit from this class and implement
+    `determine_board_move` instead of `determine_next_move`.
+
+    The game gives every bot the same board, which it keeps up to date itself, so it is much cheaper than copying the
+    snakes for every move. The board must not be modified, and it changes after the move, so keep a copy of anything
+    you want to remember.
+    """
+
+    @abstractmethod
+    def determine_board_move(self, board: Board) -> Move:
+        """
+        When your snake is about to move, this method is called. Please return a Move
+
+        :param board: The field, your snake has index `board.index(self.id)`
+        :return: The move you want to make
+        """
+        pass
+
+    def determine_next_move(self, snake: Snake, other_snakes: List[Snake], candies: List[np.array]) -> Move:
+        # the snakes are passed in turn order, which is lost here, so the own snake goes first
+        return self.determine_board_move(Board(self.grid_size, [snake] + other_snakes, candies))
@@ -0,0 +1,165 @@
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Training data for learned bots, extracted from replays
+
+A dataset is a directory with one raw binary file per array and `index.json` describing their dtype and shape. All
+arrays have one row per position in which a snake moved:
+
+- `planes`: uint8 (positions, snakes + 1, width, height), indexed by [position, plane, x, y]. Plane 0 is the
+  occupancy of the snake that moves, followed by the other snakes in order of their index in the replay. The last plane
+  contains the candies.
+- `move`: uint8, the recorded move as index into `snakes.constants.MOVES`
+- `rank`: uint8, the final rank of the snake that moves
+- `replay`: int32, index of the replay in the archive
+- `turns`: int32, `State.turns` of the position
+- `snake`: uint8, index of the snake that moves in the replay
+
+`load_dataset` maps the files into memory, so they can be streamed without reading them first.
+"""
+
+import json
+import os
+from multiprocessing import Pool
+
+import numpy as np
+
+from .constants import MOVES
+from .replay import ReplayArchive, ReplayReader
+
+INDEX = 'index.json'
+
+ARRAYS = {
+    'planes': np.uint8,
+    'move': np.uint8,
+    'rank': np.uint8,
+    'replay': np.int32,
+    'turns': np.int32,
+    'snake': np.uint8,
+}
+
+
+def replay_arrays(doc, grid_size, snakes):
+    """
+    :param grid_size: Size of the planes, replays on a smaller grid are padded
+    :param snakes: Amount of snake planes, replays with less snakes get empty planes
+    :return: Dict with the arrays of `ARRAYS` for the positions of a single replay, except 'replay'
+    """
+    reader = ReplayReader(doc)
+    history = reader.history
+    if len(history.initial_snakes) > snakes or np.any(np.greater(history.grid_size, grid_size)):
+        raise ValueError(f'Replay with {len(history.initial_snakes)} snakes on a {history.grid_size} grid does not fit '
+                         f'in {snakes} planes of {grid_size}')
+
+    arrays = {name: [] for name in ARRAYS if name != 'replay'}
+    for state, action in reader.positions():
+        occupancy = np.zeros((snakes + 1, *grid_size), dtype=np.uint8)
+        for snake in state.snakes:
+            if snake is not None:
+                occupancy[snake.id, snake.positions[:, 0], snake.positions[:, 1]] = 1
+        for x, y in state.candies:
+            occupancy[snakes, x, y] = 1
+
+        for index, move in action.items():
+            order = [index] + [i for i in range(snakes) if i != index] + [snakes]
+            arrays['planes'].append(occupancy[order])
+            arrays['move'].append(MOVES.index(move))
+            arrays['rank'].append(doc['rank'][index])
+            arrays['turns'].append(state.turns)
+            arrays['snake'].append(index)
+
+    shapes = {'planes': (-1, snakes + 1, *grid_size)}
+    return {name: np.array(values, dtype=ARRAYS[name]).reshape(shapes.get(name, (-1,)))
+            for name, values in arrays.items()}
+
+
+_archive = None  # type: ReplayArchive | None
+
+
+def _init_worker(path):
+    global _archive
+    _archive = ReplayArchive(path)
+
+
+def _run_worker(args):
+    i, grid_size, snakes = args
+    return i, replay_arrays(_archive[i], grid_size, snakes)
+
+
+def export_dataset(path, output, selection=None, grid_size=None, snakes=None, jobs=None):
+    """
+    Write the positions of replays to a dataset directory, see the module documentation
+
+    The replays are re-simulated in parallel, and the arrays of each replay are appended to the files as soon as it is
+    done, so the dataset does not need to fit in memory.
+
+    :param path: Replay file
+    :param output: Dataset directory, created if it does not exist
+    :param selection: Indices of the replays to export, by default all
+    :param grid_size: Size of the planes, by default the grid size of the first replay
+    :param snakes: Amount of snake planes, by default the most snakes in a replay
+    :param jobs: Amount of worker processes, None for one per CPU
+    :return: The amount of positions
+    """
+    archive = ReplayArchive(path)
+    selection = list(range(len(archive))) if selection is None else list(selection)
+    if grid_size is None:
+        grid_size = ReplayReader(archive[selection[0]]).history.grid_size if selection else (16, 16)
+    if snakes is None:
+        snakes = max((len(archive.index[i]['agents']) for i in selection), default=2)
+    tasks = [(i, tuple(grid_size), snakes) for i in selection]
+
+    os.makedirs(output, exist_ok=True)
+    files = {name: open(os.path.join(output, f'{name}.bin'), 'wb') for name in ARRAYS}
+    positions = 0
+    try:
+        if jobs == 1:
+            _init_worker(path)
+            results = map(_run_worker, tasks)
+        else:
+            pool = Pool(jobs, initializer=_init_worker, initargs=(path,))
+            results = pool.imap(_run_worker, tasks, chunksize=4)
+
+        for i, arrays in results:
+            arrays['replay'] = np.full(len(arrays['move']), i, dtype=ARRAYS['replay'])
+            for name, array in arrays.items():
+                files[name].write(array.tobytes())
+            positions += len(arrays['move'])
+
+        if jobs != 1:
+            pool.close()
+    finally:
+        for f in files.values():
+            f.close()
+
+    shapes = {name: [positions] for name in ARRAYS}
+    shapes['planes'] += [snakes + 1, *grid_size]
+    index = {
+        'replays': os.path.abspath(path),
+        'positions': positions,
+        'grid_size': list(grid_size),
+        'snakes': snakes,
+        'arrays': {name: {'dtype': np.dtype(dtype).str, 'shape': shapes[name]} for name, dtype in ARRAYS.items()},
+    }
+    with open(os.path.join(output, INDEX), 'w') as f:
+        json.dump(index, f, indent=2)
+    return positions
+
+
+def load_dataset(output):
+    """
+    :param output: Dataset directory written by `export_dataset`
+    :return: Dict from array name to a read-only memory-mapped array
+    """
+    with open(os.path.join(output, INDEX)) as f:
+        index = json.load(f)
+    arrays = {}
+    for name, info in index['arrays'].items():
+        if info['shape'][0] == 0:
+            arrays[name] = np.zeros(info['shape'], dtype=info['dtype'])  # an empty file can not be mapped
+        else:
+            arrays[name] = np.memmap(os.path.join(output, f'{name}.bin'), dtype=info['dtype'], mode='r',
+                                     shape=tuple(info['shape']))
+    return arrays
@@ -4,103 +4,457 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
-from math import isnan
+# pandas and scipy are imported inside the functions that need them. They take most of a second to import, which
+# would otherwise be paid by every entry point and every worker process, even when no summary is computed.
+
+from math import log
 
 import numpy as np
-import pandas as pd
-from more_itertools import pairwise
-from scipy.optimize import least_squares
 
 
 def estimate_elo(df):
-    x0 = np.empty(df.shape[1])
-    x0[:] = 1500
+    """
+    Estimate the elo rating of each bot by a least squares fit of the expected scores on the match results
+
+    Only bots that are next to each other in the ranking of a match are compared. All comparisons are aggregated per
+    pair of bots first, so the cost of the fit does not depend on the amount of matches.
+
+    :param df: One row per match, one column per bot with its rank. NaN if the bot did not participate
+    :return: The elo rating per bot
+    """
+    import pandas as pd
+
+    wins, draws = pairwise_counts(df.to_numpy(dtype=float), adjacent=True)
+    return pd.Series(least_squares_elo(wins, draws, verbose=2), index=df.columns)
 
-    def fun(x):
-        # print()
-        residuals = []
-        for _, row in df.iterrows():
-            tmp = np.argsort(row.values)
-            for a, b in pairwise(tmp):
-                # a & b are the index into the row
-
-                # check if that player participated in that match (otherwise, the rank would be NaN)
-                if isnan(row[a]) or isnan(row[b]):
-                    continue
-
-                rating_a = x[a]
-                rating_b = x[b]
-                expected = expected_score(rating_a, rating_b)
-                # 1 win, 0 loss, 0.5 draw
-                actual = (np.sign(row[b] - row[a]) + 1) / 2
-
-                assert not isnan(actual), (actual, row, a, b)
-                # print(f'player {a} vs {b} | {rating_a:.0f} {rating_b:.0f} | {expected:.4} {actual}')
-                residuals.append(actual - expected)
 
+def least_squares_elo(wins, draws, verbose=0):
+    """
+    Least squares fit of the elo ratings on a win/draw count matrix, see `estimate_elo`
+
+    :param wins: wins[a, b] is the number of times a won against b
+    :param draws: draws[a, b] is the number of draws between a and b
+    :param verbose: Verbosity of `scipy.optimize.least_squares`
+    :return: The elo rating per bot, with an average of 1500
+    """
+    from scipy.optimize import least_squares
+
+    n = len(wins)
+
+    # Summing (actual - expected)^2 over all matches between a and b is, up to a constant, the same as
+    # n_ab * (mean_actual - expected)^2. So one residual per pair of bots, weighted by sqrt(n_ab), gives the same fit.
+    matches = wins + wins.T + draws
+    a, b = np.nonzero(np.triu(matches, 1))
+    weight = np.sqrt(matches[a, b])
+    actual = (wins[a, b] + draws[a, b] / 2) / matches[a, b]  # 1 win, 0 loss, 0.5 draw
+    rows = np.arange(len(a))
+
+    def fun(x):
+        expected = expected_score(x[a], x[b])
         # force elo rating average to be 1500
-        residuals.append(np.average(x) - 1500)
-        # print(residuals)
-        return np.array(residuals)
+        return np.append(weight * (actual - expected), np.average(x) - 1500)
+
+    def jac(x):
+        expected = expected_score(x[a], x[b])
+        derivative = weight * log(10) / 400 * expected * (1 - expected)
+        jacobian = np.zeros((len(a) + 1, n))
+        jacobian[rows, a] = -derivative
+        jacobian[rows, b] = derivative
+        jacobian[-1] = 1 / n
+        return jacobian
+
+    x0 = np.full(n, 1500.)
+    res = least_squares(fun, x0, jac=jac, verbose=verbose)
+    return res.x
+
+
+def estimate_bradley_terry(df, prior=1.0):
+    """
+    Estimate the elo rating of each bot with a Bradley-Terry model
+
+    Multi-player matches are broken up into all pairs of participants, which is a consistent estimator of the
+    Plackett-Luce model for full rankings. The matches are aggregated into a win/draw count matrix first, the solver
+    only works on that matrix.
+
+    :param df: One row per match, one column per bot with its rank. NaN if the bot did not participate
+    :param prior: Amount of virtual draws of each bot against a 1500 rated opponent, see `bradley_terry`
+    :return: The elo rating per bot
+    """
+    import pandas as pd
+
+    wins, draws = pairwise_counts(df.to_numpy(dtype=float))
+    return pd.Series(bradley_terry(wins, draws, prior=prior), index=df.columns)
+
+
+def bradley_terry(wins, draws=None, prior=1.0, tolerance=1e-10, max_iterations=100000, initial=None):
+    """
+    Fit a Bradley-Terry model with the MM algorithm (Hunter, 2004)
+
+    Each iteration costs O(n^2) for n bots, independent of the amount of matches. A draw counts as half a win for
+    both bots.
+
+    :param wins: wins[a, b] is the number of times a won against b
+    :param draws: draws[a, b] is the number of draws between a and b
+    :param prior: Amount of virtual draws of each bot against a 1500 rated opponent. This keeps the ratings finite
+                  for bots that never won or never lost. Use 0 for the plain maximum likelihood estimate
+    :param tolerance: Stop when the relative change of every strength is below this value
+    :param max_iterations: Stop after this many iterations
+    :param initial: Elo ratings to start from, for example the solution of a previous fit
+    :return: The elo rating per bot, with an average of 1500
+    """
+    wins = np.asarray(wins, dtype=float)
+    draws = np.zeros_like(wins) if draws is None else np.asarray(draws, dtype=float)
+    n = len(wins)
+
+    scores = wins + draws / 2
+    matches = wins + wins.T + draws
+    if prior:
+        # add a virtual reference bot at index n
+        scores = np.pad(scores, ((0, 1), (0, 1)), constant_values=prior / 2)
+        matches = np.pad(matches, ((0, 1), (0, 1)), constant_values=prior)
+        scores[n, n] = matches[n, n] = 0
+    total_score = scores.sum(axis=1)
+
+    strength = np.ones(len(scores))
+    if initial is not None:
+        strength[:n] = 10 ** ((np.asarray(initial, dtype=float) - 1500) / 400)
+    for _ in range(max_iterations):
+        new_strength = total_score / (matches / (strength[:, None] + strength[None, :])).sum(axis=1)
+        new_strength /= new_strength[n] if prior else new_strength.max()
+        converged = np.all(np.abs(new_strength - strength) <= tolerance * strength)
+        strength = new_strength
+        if converged:
+            break
+
+    with np.errstate(divide='ignore'):
+        elo = 400 * np.log10(strength[:n])
+    return elo - np.mean(elo[np.isfinite(elo)]) + 1500
+
+
+def bradley_terry_errors(elo, wins, draws=None, prior=1.0):
+    """
+    Standard error of Bradley-Terry ratings, from the inverse of the Fisher information
+
+    :param elo: The ratings as returned by `bradley_terry`
+    :param wins: wins[a, b] is the number of times a won against b
+    :param draws: draws[a, b] is the number of draws between a and b
+    :param prior: The prior that was used for the fit
+    :return: The standard error of each rating, in elo points
+    """
+    wins = np.asarray(wins, dtype=float)
+    matches = wins + wins.T + (0 if draws is None else np.asarray(draws, dtype=float))
+    expected = expected_score(elo[:, None], elo[None, :])
+    information = -matches * expected * (1 - expected)
+    information[np.diag_indices_from(information)] = -information.sum(axis=1)
+    if prior:
+        expected = expected_score(elo, 1500)
+        information[np.diag_indices_from(information)] += prior * expected * (1 - expected)
+    # the ratings are shifted to an average of 1500, so project out the uncertainty of the average
+    centering = np.eye(len(elo)) - 1 / len(elo)
+    covariance = centering @ np.linalg.pinv(information) @ centering
+    return 400 / log(10) * np.sqrt(np.clip(np.diag(covariance), 0, None))
+
+
+class OnlineRating:
+    """
+    Bradley-Terry ratings that are updated while the results of a tournament come in
+
+    Every result is added to the win/draw count matrices, which is cheap. A fit starts from the previous solution so it
+    only needs a few iterations.
+    """
+
+    def __init__(self, names, prior=1.0):
+        self.names = list(names)
+        n = len(self.names)
+        self.prior = prior
+        self.wins = np.zeros((n, n), dtype=int)
+        self.draws = np.zeros((n, n), dtype=int)
+        self.won = np.zeros(n, dtype=int)
+        self.played = np.zeros(n, dtype=int)
+        self.elo = np.full(n, 1500.)
+        self.errors = np.full(n, np.inf)
+
+    def update(self, ranking):
+        """
+        Add the result of a single match
+
+        :param ranking: map from bot index to its rank in the match
+        """
+        row = np.full(len(self.names), np.nan)
+        row[list(ranking.keys())] = list(ranking.values())
+        wins, draws = pairwise_counts(row[None, :])
+        self.wins += wins
+        self.draws += draws
+        self.played[list(ranking.keys())] += 1
+        self.won[[i for i, rank in ranking.items() if rank == 1]] += 1
+
+    def fit(self):
+        self.elo = bradley_terry(self.wins, self.draws, prior=self.prior, initial=self.elo)
+        self.errors = bradley_terry_errors(self.elo, self.wins, self.draws, prior=self.prior)
+        return self.elo
+
+    def print_leaderboard(self):
+        """
+        Fit the ratings and print them with their 95% confidence interval
+        """
+        self.fit()
+        print(f'{"Name":30} {"Elo":>7} {"95%":>7} {"Rate":>6} {"Matches":>7}')
+        for i in np.argsort(-self.elo):
+            rate = self.won[i] / self.played[i] if self.played[i] else np.nan
+            print(f'{self.names[i]:30} {self.elo[i]:7.1f} {1.96 * self.errors[i]:7.1f} {rate:6.1%} '
+                  f'{self.played[i]:7}')
+
+
+# rating estimators by name, each computes the elo rating per bot from the counts of a `TournamentStats`, like
+# `estimate_elo` and `estimate_bradley_terry` do from a table of results
+ELO_METHODS = {
+    'least_squares': lambda stats: least_squares_elo(stats.adjacent_wins, stats.adjacent_draws, verbose=2),
+    'bradley_terry': lambda stats: bradley_terry(stats.pair_wins, stats.pair_draws),
+}
 
-    res = least_squares(fun, x0, verbose=2)
-    return pd.Series(res.x, index=df.columns)
+
+def ranked_pairs(ranking, adjacent=False):
+    """
+    Extract all pairwise comparisons from a matrix of match rankings
+
+    :param ranking: One row per match, one column per bot with its rank. NaN if the bot did not participate
+    :param adjacent: Only compare bots that are next to each other in the ranking of a match
+    :return: Index arrays (match, a, b) of the match and the compared bots, and the score of a against b: 1 for a win,
+             0.5 for a draw. Bot a is always the one with the better (or equal) rank
+    """
+    ranking = np.asarray(ranking, dtype=float)
+    if ranking.size == 0:
+        empty = np.empty(0, dtype=int)
+        return empty, empty, empty, np.empty(0)
+
+    order = np.argsort(ranking, axis=1, kind='stable')  # participants first, NaN is sorted last
+    sorted_ranking = np.take_along_axis(ranking, order, axis=1)
+
+    # only the first k columns can contain participants
+    k = int(np.max(np.sum(~np.isnan(ranking), axis=1)))
+    if adjacent:
+        u, v = np.arange(k - 1), np.arange(1, k)
+    else:
+        u, v = np.triu_indices(k, 1)
+
+    rank_a = sorted_ranking[:, u]
+    rank_b = sorted_ranking[:, v]
+    valid = ~np.isnan(rank_a) & ~np.isnan(rank_b)
+
+    match = np.nonzero(valid)[0]
+    a = order[:, u][valid]
+    b = order[:, v][valid]
+    score = (np.sign(rank_b - rank_a)[valid] + 1) / 2
+    return match, a, b, score
+
+
+def pairwise_counts(ranking, adjacent=False):
+    """
+    Count the wins and draws between every pair of bots
+
+    :param ranking: One row per match, one column per bot with its rank. NaN if the bot did not participate
+    :param adjacent: Only compare bots that are next to each other in the ranking of a match
+    :return: Matrices (wins, draws). wins[a, b] is the number of times a ranked better than b, draws is symmetric
+    """
+    _, a, b, score = ranked_pairs(ranking, adjacent)
+    return count_pairs(np.shape(ranking)[1], a, b, score)
+
+
+def count_pairs(n, a, b, score, weights=None):
+    """
+    Aggregate pairwise comparisons, as returned by `ranked_pairs`, into win and draw count matrices
+
+    :param n: The amount of bots
+    :param weights: Optional weight of each comparison, for example the number of times its match was resampled
+    :return: Matrices (wins, draws). wins[a, b] is the number of times a ranked better than b, draws is symmetric
+    """
+    win = score == 1
+    if weights is None:
+        wins = np.bincount(a[win] * n + b[win], minlength=n * n)
+        draws = np.bincount(a[~win] * n + b[~win], minlength=n * n)
+    else:
+        wins = np.bincount(a[win] * n + b[win], weights[win], minlength=n * n)
+        draws = np.bincount(a[~win] * n + b[~win], weights[~win], minlength=n * n)
+    draws = draws.reshape(n, n)
+    return wins.reshape(n, n), draws + draws.T
 
 
 def expected_score(rating_a, rating_b):
     return 1 / (1 + 10 ** ((rating_b - rating_a) / 400))
 
 
-def print_tournament_summary(df, elo=True):
+# prefixes of the columns with a statistic per bot: CPU time in seconds, and with memory tracking the bytes retained
+# during the match and the most bytes allocated during a single move
+STATISTIC_PREFIXES = ('cpu_', 'mem_', 'peak_')
+# prefix of the columns with the nanoseconds spent in each phase of the game engine, with phase timing
+PHASE_PREFIX = 'phase_'
+
+
+def bot_names(columns):
+    """
+    The columns of a tournament results table that contain the ranking of a bot
+    """
     reserved_names = ['turns', 'seed']
-    names = [name for name in df.columns if name not in reserved_names and not name.startswith('cpu_')]
-    cpu_names = ['cpu_' + name for name in names]
+    return [name for name in columns
+            if name not in reserved_names and not name.startswith(STATISTIC_PREFIXES + (PHASE_PREFIX,))]
+
+
+class TournamentStats:
+    """
+    Statistics per bot, accumulated over chunks of tournament results
+
+    Memory usage only depends on the amount of bots, so arbitrarily large result files can be summarized.
+    """
+
+    def __init__(self):
+        self.names = None
+        self.wins = self.matches = self.cpu = self.turns = 0
+        self.memory = self.memory_peak = None  # only for results with memory tracking
+        self.pair_wins = self.pair_draws = 0  # all pairs of participants
+        self.adjacent_wins = self.adjacent_draws = 0  # only neighbours in the ranking, see `estimate_elo`
 
-    ranking = df[names]  # contains only the individual match rankings
+    @classmethod
+    def from_chunks(cls, chunks):
+        stats = cls()
+        for chunk in chunks:
+            stats.update(chunk)
+        return stats
 
-    data = {
-        'Wins': (ranking == 1).sum(),
-        'Matches': ranking.notna().sum(),
-        'CPU': df[cpu_names].sum().rename(dict(zip(cpu_names, names))),
-        'Turns': calculate_turns(df, names)
-    }
+    def update(self, df):
+        """
+        Add a chunk of results, one row per match
+        """
+        names = bot_names(df.columns)
+        assert self.names is None or self.names == names, (self.names, names)
+        self.names = names
 
-    data = pd.DataFrame(data)
+        ranking = df[names].to_numpy(dtype=float)  # contains only the individual match rankings
+        played = ~np.isnan(ranking)
+        self.wins = self.wins + (ranking == 1).sum(axis=0)
+        self.matches = self.matches + played.sum(axis=0)
+        self.cpu = self.cpu + np.nansum(df[['cpu_' + name for name in names]].to_numpy(dtype=float), axis=0)
+        self.turns = self.turns + df['turns'].to_numpy() @ played
+        if all('mem_' + name in df.columns for name in names):
+            memory = df[['mem_' + name for name in names]].to_numpy(dtype=float)
+            peak = df[['peak_' + name for name in names]].to_numpy(dtype=float)
+            self.memory = (0 if self.memory is None else self.memory) + np.nansum(memory, axis=0)
+            peak = np.max(np.where(np.isnan(peak), -np.inf, peak), axis=0, initial=-np.inf)
+            self.memory_peak = peak if self.memory_peak is None else np.maximum(self.memory_peak, peak)
+
+        wins, draws = pairwise_counts(ranking)
+        self.pair_wins = self.pair_wins + wins
+        self.pair_draws = self.pair_draws + draws
+        wins, draws = pairwise_counts(ranking, adjacent=True)
+        self.adjacent_wins = self.adjacent_wins + wins
+        self.adjacent_draws = self.adjacent_draws + draws
+
+    def elo(self, method='least_squares'):
+        """
+        :param method: Rating estimator, see `ELO_METHODS`
+        :return: The elo rating per bot
+        """
+        if method not in ELO_METHODS:
+            raise ValueError(f'Unknown rating method {method!r}')
+        return ELO_METHODS[method](self)
+
+    def to_frame(self):
+        import pandas as pd
+
+        data = {'Wins': self.wins, 'Matches': self.matches, 'CPU': self.cpu, 'Turns': self.turns}
+        if self.memory is not None:
+            data.update({'Memory': self.memory, 'Peak': np.where(np.isinf(self.memory_peak), np.nan, self.memory_peak)})
+        return pd.DataFrame(data, index=self.names)
+
+
+def print_tournament_summary(df, elo=True, method='least_squares', bootstrap=0, jobs=None):
+    """
+    Print the wins, CPU usage, memory usage if it was tracked, and elo rating of each bot
+
+    :param df: The tournament results, one row per match. Either a single DataFrame or an iterable of chunks
+    :param elo: Estimate the elo ratings
+    :param method: Rating estimator, see `ELO_METHODS`
+    :param bootstrap: Amount of resamples for 95% confidence intervals of the win rate and elo rating, 0 to disable.
+                      This needs a single DataFrame
+    :param jobs: Amount of worker processes for the resampling, None for one per CPU
+    """
+    import pandas as pd
+
+    if elo and method not in ELO_METHODS:
+        raise ValueError(f'Unknown rating method {method!r}')
+    stats = TournamentStats.from_chunks([df] if isinstance(df, pd.DataFrame) else df)
+    names = stats.names
+    data = stats.to_frame()
 
     data['Rate'] = data['Wins'] / data['Matches']
     data['CPU/t'] = 1000 * data['CPU'] / data['Turns']
     data['Turns/m'] = data['Turns'] / data['Matches']
+    columns = ['Wins', 'Rate', 'CPU', 'CPU/t']
+    if 'Memory' in data:
+        # kB retained per match, and the largest allocation during a move in kB
+        data['kB/m'] = data['Memory'] / data['Matches'] / 1000
+        data['Peak kB'] = data['Peak'] / 1000
+        columns += ['kB/m', 'Peak kB']
 
     # reorder columns
-    data = data[['Wins', 'Rate', 'CPU', 'CPU/t', 'Matches', 'Turns/m']]
+    data = data[columns + ['Matches', 'Turns/m']]
     data.sort_values('Rate', inplace=True, ascending=False)
 
-    # rounding before display
-    data['Rate'] = data['Rate']
-    data['CPU'] = data['CPU']
-    data['CPU/t'] = data['CPU/t']
-
-    print(data.to_string(formatters={'Rate': '{:,.1%}'.format, 'CPU': '{:.1f}'.format, 'CPU/t': '{:.3f}'.format,
-                                     'Turns/m': '{:.1f}'.format, 'Elo': '{:.1f}'.format}))
+    formatters = {'Rate': '{:,.1%}'.format, 'CPU': '{:.1f}'.format, 'CPU/t': '{:.3f}'.format,
+                  'kB/m': '{:.1f}'.format, 'Peak kB': '{:.1f}'.format, 'Turns/m': '{:.1f}'.format,
+                  'Elo': '{:.1f}'.format}
+    print(data.to_string(formatters=formatters))
 
     if not elo:
         return
-    data['Elo'] = estimate_elo(ranking)
+    data['Elo'] = pd.Series(stats.elo(method), index=names)
+
+    if bootstrap:
+        from .bootstrap import bootstrap as resample, confidence_interval
+
+        elo_samples, rate_samples, _ = resample(df[names], bootstrap, method=method, jobs=jobs)
+        for column, samples, fmt in [('Rate', rate_samples, '{:.1%}'), ('Elo', elo_samples, '{:.1f}')]:
+            low, high = confidence_interval(samples)
+            data[f'{column} 95%'] = pd.Series([f'{fmt.format(lo)}-{fmt.format(hi)}' for lo, hi in zip(low, high)],
+                                              index=names)
 
     print()
-    print(data.to_string(formatters={'Rate': '{:,.1%}'.format, 'CPU': '{:.1f}'.format, 'CPU/t': '{:.3f}'.format,
-                                     'Turns/m': '{:.1f}'.format, 'Elo': '{:.1f}'.format}))
+    print(data.to_string(formatters=formatters))
+
+
+def print_phase_summary(df):
+    """
+    Print the time spent in each phase of the game engine, to see whether the engine or the bots limit the throughput
+
+    :param df: The tournament results, one row per match, with a column per phase in nanoseconds
+    """
+    import pandas as pd
+
+    columns = [column for column in df.columns if column.startswith(PHASE_PREFIX)]
+    if not columns:
+        return
+    totals = df[columns].sum()
+    totals.index = [column[len(PHASE_PREFIX):] for column in columns]
+    turns = df['turns'].sum()
+    data = pd.DataFrame({'Time': totals / 1e9, 'us/t': totals / 1e3 / turns, 'Share': totals / totals.sum()})
+    print(data.to_string(formatters={'Time': '{:.2f}'.format, 'us/t': '{:.1f}'.format, 'Share': '{:.1%}'.format}))
+    engine = totals.drop('bots', errors='ignore').sum()
+    print(f'engine {engine / 1e3 / turns:.1f} us/t, bots {totals.get("bots", 0) / 1e3 / turns:.1f} us/t')
+
+
+def read_csv(filepath_or_buffer, chunksize=None):
+    """
+    Read tournament results
 
+    :param chunksize: Return an iterator over DataFrames of this many matches instead of a single DataFrame
+    """
+    import pandas as pd
 
-def calculate_turns(df, names):
-    turns = {}
-    for col in df[names]:
-        turns[col] = df['turns'][df[col].notna()].sum()
-    return pd.Series(turns)
+    if chunksize:
+        return (_convert_turns(chunk) for chunk in pd.read_csv(filepath_or_buffer, dtype=float, chunksize=chunksize))
+    return _convert_turns(pd.read_csv(filepath_or_buffer, dtype=float))
 
 
-def read_csv(filepath_or_buffer):
-    df = pd.read_csv(filepath_or_buffer, dtype=float)
+def _convert_turns(df):
     if 'turns' in df.columns:
         df = df.astype({'turns': int})
     return df
@@ -2,22 +2,31 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 import re
+import tracemalloc
+from contextlib import nullcontext
 from copy import deepcopy
 from enum import Enum, auto
+from functools import partial
 from math import floor
 from pprint import pformat
 from random import sample
-from time import time
+from time import perf_counter_ns, time
 from traceback import print_exception
 from typing import List, Tuple, Type, Dict, Iterator
 
 import numpy as np
 
-from .bot import Bot
+from .board import Board
+from .bot import Bot, BoardBot
 from .constants import MOVE_VALUE_TO_DIRECTION, Move, MAX_TURNS, UP, DOWN, LEFT, RIGHT, MOVES
 from .snake import Snake
 
 
+# the stages of `Game.update` that are timed with `Game(time_phases=True)`: copying the arguments of the bots, the moves
+# of the bots, logging the history, moving the snakes, checking for collisions and respawning candies
+PHASES = ('copy', 'bots', 'history', 'moves', 'collisions', 'candies')
+
+
 class RoundType(Enum):
     SIMULTANEOUS = auto()
     TURNS = auto()
@@ -160,6 +169,26 @@ def print_event(event: GameEvent, agents: Dict[int, str]):
         assert False, "Unknown event type"
 
 
+class PhaseTimer:
+    """
+    Context manager that adds the time of its block to a phase, see `State.timed`
+    """
+
+    def __init__(self, phases: Dict[str, int], phase: str):
+        self.phases = phases
+        self.phase = phase
+        self.start = None
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+
+    def __exit__(self, *exception):
+        self.phases[self.phase] += perf_counter_ns() - self.start
+
+
+NOT_TIMED = nullcontext()
+
+
 class State:
     def __init__(self,
                  snakes: List[Snake],
@@ -178,6 +207,8 @@ class State:
         self.candies = candies if candies is not None else []
         self.max_turns = max_turns
         self.scores = {}  # map from snake.id to score
+        self._board = None  # made on first use, see `board`
+        self.phases = None  # map from phase to the nanoseconds spent in it, None to not time the phases
 
         # Initial candy spawns are logged as move, so we don't need to include them to the history
         self.history = GameHistory(self.grid_size, self.snakes, self.candies)
@@ -191,6 +222,15 @@ class State:
         snake_ids = [snake.id for snake in self.snakes]
         assert len(snake_ids) == len(set(snake_ids))
 
+    @property
+    def board(self) -> Board:
+        """
+        The `Board` for bots, which is made on first use and then kept up to date by `do_moves` and `spawn_candy`
+        """
+        if self._board is None:
+            self._board = Board(self.grid_size, self.snakes, self.candies, self.turns)
+        return self._board
+
     def players_turn(self) -> Iterator[Snake]:
         """Return all players that should play a move in the next turn"""
         if self.round_type == RoundType.SIMULTANEOUS:
@@ -205,57 +245,21 @@ class State:
             should_move = set(self.players_turn())
             has_moves = set(s for s, _ in moves)
             assert should_move == has_moves, f'{should_move} == {has_moves}'
-        self.history.log_moves(moves)
-
-        # first, move the snakes and record which candies have been eaten
-        remove_candies = set()
-        for snake, move_value in moves:
-            if not isinstance(move_value, Move):
-                continue  # skip bots that did an invalid move
-            move = MOVE_VALUE_TO_DIRECTION[move_value]
-            for i, candy in enumerate(self.candies):
-                if np.array_equal(snake[0] + move, candy):
-                    remove_candies.add(i)
-                    snake.move(move, grow=True)
-                    break
-            else:
-                snake.move(move)
-        self.candies = [i for j, i in enumerate(self.candies) if j not in remove_candies]
-
-        # figure out which snakes died
-        dead = []
-        for snake, move_value in moves:  # we only need to check the snakes that have moved
-            if not isinstance(move_value, Move):
-                yield InvalidMove(snake, move_value)
-                dead.append(snake)
-                continue
-            if not (0 <= snake[0][0] < self.grid_size[0] and 0 <= snake[0][1] < self.grid_size[1]):
-                yield OutOfBounds(snake)
-                dead.append(snake)
-                continue
-
-            for other_snake in self.snakes:
-                if other_snake is None:
-                    pass
-                elif snake == other_snake:
-                    self_collision = False
-                    # self collision, don't check head
-                    for p in snake[1:]:
-                        if np.array_equal(p, snake[0]):
-                            self_collision = True
-                            break
-                    if self_collision:
-                        yield Collision(snake, snake)
-                        dead.append(snake)
-                        break
-                elif other_snake.collides(snake[0]):
-                    yield Collision(snake, other_snake)
-                    dead.append(snake)
-                    break
-
+        with self.timed('history'):
+            self.history.log_moves(moves)
+        with self.timed('moves'):
+            self._move_snakes(moves)
+        # the events are yielded afterwards, so the time of the caller is not counted
+        with self.timed('collisions'):
+            events = self._find_collisions(moves)
+        yield from events
+
+        dead = [event.snake for event in events]
         for snake in dead:
             snake.dead = True
             self.dead_snakes.append(snake)
+            if self._board is not None:
+                self._board.remove(self.snakes.index(snake))
             self.snakes[self.snakes.index(snake)] = None
 
         rank = sum(1 for s in self.snakes if s is not None) + 1
@@ -278,6 +282,9 @@ class State:
                     break
                 # otherwise, skip agents that are dead
 
+        if self._board is not None:
+            self._board.set_turns(self.turns)
+
         # check if the game has finished
         game_finished = sum(1 for s in self.snakes if s is not None) <= 1 or self.turns >= self.max_turns
 
@@ -289,6 +296,63 @@ class State:
                     self.scores[snake.id] = score
             yield Finished(self)
 
+    def _move_snakes(self, moves: List[Tuple[Snake, Move]]):
+        """
+        Move the snakes and remove the candies that have been eaten
+        """
+        board = self._board
+        remove_candies = set()
+        for snake, move_value in moves:
+            if not isinstance(move_value, Move):
+                continue  # skip bots that did an invalid move
+            move = MOVE_VALUE_TO_DIRECTION[move_value]
+            tail = snake[-1].copy() if board is not None else None
+            grow = False
+            for i, candy in enumerate(self.candies):
+                if np.array_equal(snake[0] + move, candy):
+                    remove_candies.add(i)
+                    grow = True
+                    break
+            snake.move(move, grow=grow)
+            if board is not None:
+                board.move(self.snakes.index(snake), snake, tail, grow)
+        if board is not None:
+            for i in remove_candies:
+                board.set_candy(self.candies[i], False)
+        self.candies = [i for j, i in enumerate(self.candies) if j not in remove_candies]
+
+    def _find_collisions(self, moves: List[Tuple[Snake, Move]]) -> List[GameEvent]:
+        """
+        :return: An event for every snake that died by its move
+        """
+        events = []
+        for snake, move_value in moves:  # we only need to check the snakes that have moved
+            if not isinstance(move_value, Move):
+                events.append(InvalidMove(snake, move_value))
+                continue
+            if not (0 <= snake[0][0] < self.grid_size[0] and 0 <= snake[0][1] < self.grid_size[1]):
+                events.append(OutOfBounds(snake))
+                continue
+
+            for other_snake in self.snakes:
+                if other_snake is None:
+                    pass
+                elif snake == other_snake:
+                    # self collision, don't check head
+                    if any(np.array_equal(p, snake[0]) for p in snake[1:]):
+                        events.append(Collision(snake, snake))
+                        break
+                elif other_snake.collides(snake[0]):
+                    events.append(Collision(snake, other_snake))
+                    break
+        return events
+
+    def timed(self, phase: str):
+        """
+        :return: Context manager that adds the time of its block to a phase, if the phases are timed
+        """
+        return PhaseTimer(self.phases, phase) if self.phases is not None else NOT_TIMED
+
     def respawn_candies(self):
         # respawn new candies
         n_indices = self.grid_size[0] * self.grid_size[1]
@@ -305,31 +369,94 @@ class State:
     def spawn_candy(self, x, y):
         self.candies.append(np.array([x, y]))
         self.history.log_candy_spawn((x, y))
+        if self._board is not None:
+            self._board.set_candy((x, y), True)
 
     def __repr__(self):
         return f'{self.__class__.__name__}({pformat(self.__dict__, indent=2)})'
 
 
+def traced_call(function):
+    """
+    Call `function()` while `tracemalloc` is tracing
+
+    Pass the arguments of the measured function by keyword, in a closure like `lambda: f(x=x)`. Unpacking a dict with
+    `f(**arguments)` allocates memory in the interpreter that is freed later, which would be counted. Likewise, numpy
+    keeps the small buffers of arrays that are freed for reuse, which adds about 16 bytes per array that is made during
+    the call, up to the size of that cache.
+
+    Python 3.8 can not reset the peak of the traced memory, there the traces are cleared instead. Then memory that was
+    allocated before the call and is freed during the call is not subtracted.
+
+    :return: The result or the exception it raised, the bytes it allocated and did not free, and the most bytes it had
+             allocated at once
+    """
+    overhead = _traced_call_overhead()
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.clear_traces()
+    before = tracemalloc.get_traced_memory()[0]
+    try:
+        result = function()
+    except Exception as e:
+        result = e
+    current, peak = tracemalloc.get_traced_memory()
+    return result, current - before - overhead, peak - before - overhead
+
+
+_traced_call_overhead_bytes = None  # bytes that `traced_call` measures for a function that does nothing
+
+
+def _traced_call_overhead():
+    # the measurement itself holds on to some memory, like `before`
+    global _traced_call_overhead_bytes
+    if _traced_call_overhead_bytes is None:
+        _traced_call_overhead_bytes = 0
+        _traced_call_overhead_bytes = min(traced_call(lambda: None)[1] for _ in range(3))
+    return _traced_call_overhead_bytes
+
+
 class Game:
     def __init__(self, agents: Dict[int, Type],
                  grid_size: Tuple[int, int] = (16, 16),
                  round_type: RoundType = RoundType.TURNS,
                  snakes: List[Snake] = None,
                  candies: List[np.array] = None,
-                 max_turns: int = MAX_TURNS):
-
+                 max_turns: int = MAX_TURNS,
+                 profiler=None,
+                 track_memory: bool = False,
+                 time_phases: bool = False):
+        """
+        :param profiler: `snakes.profiling.Profiler` to run the moves of the bots under, None to not profile
+        :param track_memory: Record the memory allocated by the bots with `tracemalloc`, which slows down the game
+        :param time_phases: Record the nanoseconds spent in each of the `PHASES` of `update` in `phases`
+        """
         assert isinstance(agents, dict)
+        self.profiler = profiler
+        self.track_memory = track_memory
+        if track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
         self.agents = {}
         self.cpu = {i: 0 for i in agents}  # map from snake.id to CPU time
+        self.memory = {i: 0 for i in agents}  # map from snake.id to bytes retained by the bot, with track_memory
+        self.memory_peak = {i: 0 for i in agents}  # map from snake.id to the most bytes allocated during a move
         for i, Agent in agents.items():
             start = time()
-            self.agents[i] = Agent(id=i, grid_size=grid_size)
+            if track_memory:
+                self.agents[i], self.memory[i], _ = traced_call(lambda: Agent(id=i, grid_size=grid_size))
+                if isinstance(self.agents[i], Exception):
+                    raise self.agents[i]
+            else:
+                self.agents[i] = Agent(id=i, grid_size=grid_size)
             self.cpu[i] += time() - start
 
         if snakes is None:
             snakes = self.create_snakes(grid_size, self.agents.keys())
         self.state = State(grid_size=grid_size, round_type=round_type, snakes=snakes, candies=candies,
                            max_turns=max_turns)
+        self.phases = dict.fromkeys(PHASES, 0) if time_phases else None
+        self.state.phases = self.phases
 
         # check snake.id refers to an agent
         for snake in self.snakes:
@@ -385,19 +512,42 @@ class Game:
 
         yield from self.state.do_moves(moves)
 
-        self.state.respawn_candies()
+        with self.state.timed('candies'):
+            self.state.respawn_candies()
 
     def _get_agents_move(self, snake):
-        snake = deepcopy(snake)
-        other_snakes = [deepcopy(s) for s in self.snakes if s.id != snake.id]
-        start = time()
-        try:
-            move_value = self.agents[snake.id].determine_next_move(snake=snake, other_snakes=other_snakes,
-                                                                   candies=deepcopy(self.candies))
-        except Exception as e:
-            move_value = e
-
-        self.cpu[snake.id] += time() - start
+        agent = self.agents[snake.id]
+        # the arguments are passed by keyword instead of by unpacking a dict, see `traced_call`
+        with self.state.timed('copy'):
+            if isinstance(agent, BoardBot):
+                # all bots share the board, which the state keeps up to date
+                board = self.state.board
+
+                def determine_move():
+                    return agent.determine_board_move(board=board)
+            else:
+                # the other bots get copies, so they can not change the game
+                own_snake = deepcopy(snake)
+                other_snakes = [deepcopy(s) for s in self.snakes if s.id != snake.id]
+                candies = deepcopy(self.candies)
+
+                def determine_move():
+                    return agent.determine_next_move(snake=own_snake, other_snakes=other_snakes, candies=candies)
+            if self.profiler is not None:
+                determine_move = partial(self.profiler.call, agent.name, determine_move)
+
+        with self.state.timed('bots'):
+            start = time()
+            if self.track_memory:
+                move_value, retained, peak = traced_call(determine_move)
+                self.memory[snake.id] += retained
+                self.memory_peak[snake.id] = max(self.memory_peak[snake.id], peak)
+            else:
+                try:
+                    move_value = determine_move()
+                except Exception as e:
+                    move_value = e
+            self.cpu[snake.id] += time() - start
         return move_value
 
     def possible_scores(self) -> List[Tuple[int, int]]:
@@ -419,16 +569,7 @@ class Game:
 
     def rank(self):
         # TODO: make sure this function can only be called when the game is finished
-        possible_scores = self.possible_scores()
-
-        rank = 1
-        ranking = {}
-        previous_score = possible_scores[0][0]
-        for score, i in possible_scores:
-            if score != previous_score:
-                rank += 1
-            ranking[i] = rank
-        return ranking
+        return rank_scores(self.possible_scores())
 
     def finished(self):
         # TODO: remove this function, instead listen to Finished event
@@ -457,6 +598,44 @@ class Game:
         # return yaml.safe_dump(data, default_flow_style=True, width=inf)
 
 
+def rank_scores(possible_scores: List[Tuple[int, int]]) -> Dict[int, int]:
+    """
+    :param possible_scores: Tuples of score, agent_id sorted from high to low score
+    :return: Map from agent_id to rank
+    """
+    rank = 1
+    ranking = {}
+    previous_score = possible_scores[0][0]
+    for score, i in possible_scores:
+        if score != previous_score:
+            rank += 1
+        ranking[i] = rank
+    return ranking
+
+
+def describe_event(event: GameEvent, turns: int, ids: Dict[int, int] = None) -> str:
+    """
+    Short description of an event, to compare the events of a game with the ones of its replay
+
+    :param turns: The amount of turns that have passed when the event happened
+    :param ids: Map from snake.id to the number to describe the snake with, by default snake.id itself
+    """
+    ids = ids if ids is not None else {}
+    if isinstance(event, InvalidMove):
+        return f'{turns} invalid {ids.get(event.snake.id, event.snake.id)}'
+    elif isinstance(event, OutOfBounds):
+        return f'{turns} out-of-bounds {ids.get(event.snake.id, event.snake.id)}'
+    elif isinstance(event, Collision):
+        return f'{turns} collision {ids.get(event.snake.id, event.snake.id)} ' \
+               f'{ids.get(event.other_snake.id, event.other_snake.id)}'
+    elif isinstance(event, Death):
+        return f'{turns} death {ids.get(event.snake.id, event.snake.id)} rank {event.rank} score {event.score}'
+    elif isinstance(event, Finished):
+        return f'{turns} finished'
+    else:
+        assert False, "Unknown event type"
+
+
 def move_to_str(move: Move) -> str:
     return 'udlr'[MOVES.index(move)]
 
@@ -503,36 +682,100 @@ def serialize(grid_size, candies, turn, snakes) -> str:
     for snake in snakes:
         if snake is None:
             continue
-        snakestr = f'{snake[0][0]},{snake[0][1]}'
-        for i in range(1, len(snake)):
-            direction = snake[i] - snake[i - 1]
-            snakestr += direction_to_str(direction)
-        snakedata.append(snakestr)
+        snakedata.append(serialize_snake(snake))
     data += 's'
     data += '/'.join(snakedata)
 
     return data
 
 
+# character of a direction, indexed by 3 * (sign(dx) + 1) + sign(dy) + 1. See `direction_to_str`
+DIRECTION_CHARACTERS = np.frombuffer(b'llldpurrr', dtype=np.uint8)
+
+# direction of a character, indexed by its ASCII code. See `move_str_to_direction`
+CHARACTER_DIRECTIONS = np.zeros((256, 2), dtype=int)
+CHARACTER_DIRECTIONS[np.frombuffer(b'udlrp', dtype=np.uint8)] = [UP, DOWN, LEFT, RIGHT, [0, 0]]
+VALID_CHARACTERS = np.zeros(256, dtype=bool)
+VALID_CHARACTERS[np.frombuffer(b'udlrp', dtype=np.uint8)] = True
+
+SNAKE_PATTERN = re.compile(r'(\d+),(\d+)(\w+)')
+STATE_PATTERN = re.compile(r'([^c]*)c([^s]*)t(\d+)s(.*)')
+
+
+def serialize_snake(snake: Snake) -> str:
+    """
+    Serialize the positions of a snake to the `x,yMMMMMM` notation of `serialize`
+    """
+    signs = np.sign(np.diff(snake.positions, axis=0)) + 1
+    directions = DIRECTION_CHARACTERS[3 * signs[:, 0] + signs[:, 1]]
+    return f'{snake[0][0]},{snake[0][1]}' + directions.tobytes().decode()
+
+
 def deserialize(data: str):
-    match = re.fullmatch(r'([^c]*)c([^s]*)t(\d+)s(.*)', data)
-    grid_size = match.group(1)
-    candies = match.group(2)
-    turn = match.group(3)
-    snakesstr = match.group(4)
-
-    grid_size = tuple(int(x) for x in grid_size.split('x'))
-    candies = [tuple(int(x) for x in c.split(',')) for c in candies.split('/')] if candies else []
-    turn = int(turn)
-
-    snakes = []
-    for id, snake in enumerate(snakesstr.split('/')):
-        m = re.fullmatch('(\d+),(\d+)(\w+)', snake)
-        segment = np.array([int(m.group(1)), int(m.group(2))])
-        segments = [segment]
-        for s in m.group(3):
-            segment = segment + move_str_to_direction(s)
-            segments.append(segment)
-        snakes.append(Snake(id=id, positions=np.array(segments)))
-
-    return grid_size, candies, turn, snakes
+    return deserialize_batch([data])[0]
+
+
+def deserialize_batch(data: List[str]):
+    """
+    Deserialize many states at once, which is faster than calling `deserialize` for each of them
+
+    :param data: States serialized by `serialize`
+    :return: List of (grid_size, candies, turn, snakes) tuples
+    """
+    states = []
+    snakesstrs = []
+    for state in data:
+        match = STATE_PATTERN.fullmatch(state)
+        grid_size, candies, turn, snakesstr = match.groups()
+        grid_size = tuple(int(x) for x in grid_size.split('x'))
+        candies = [tuple(int(x) for x in c.split(',')) for c in candies.split('/')] if candies else []
+        snakesstr = snakesstr.split('/')
+        states.append((grid_size, candies, int(turn), len(snakesstr)))
+        snakesstrs += snakesstr
+
+    positions = iter(deserialize_positions(snakesstrs))
+    return [(grid_size, candies, turn, [Snake(id=id, positions=next(positions)) for id in range(snakes)])
+            for grid_size, candies, turn, snakes in states]
+
+
+def deserialize_snake(id: int, data: str) -> Snake:
+    """
+    Inverse of `serialize_snake`
+    """
+    return Snake(id=id, positions=deserialize_positions([data])[0])
+
+
+def deserialize_positions(data: List[str]) -> List[np.ndarray]:
+    """
+    Decode the positions of many snakes in the `x,yMMMMMM` notation at once
+
+    All directions are looked up in one array, and the positions follow from a single cumulative sum, with the head of
+    each snake compensating for the sum of the snakes before it.
+
+    :return: The positions of each snake
+    """
+    heads = []
+    directions = []
+    for snake in data:
+        match = SNAKE_PATTERN.fullmatch(snake)
+        if match is None:
+            raise ValueError(f'Invalid snake {snake!r}')
+        heads.append((int(match.group(1)), int(match.group(2))))
+        directions.append(match.group(3))
+    if not data:
+        return []
+
+    codes = np.frombuffer(''.join(directions).encode(), dtype=np.uint8)
+    if not VALID_CHARACTERS[codes].all():
+        raise ValueError(f'Invalid direction in {data}')
+    lengths = np.array([len(d) + 1 for d in directions])
+    starts = np.cumsum(lengths) - lengths
+
+    steps = np.empty((lengths.sum(), 2), dtype=int)
+    steps[np.delete(np.arange(len(steps)), starts)] = CHARACTER_DIRECTIONS[codes]
+    steps[starts] = heads
+    positions = np.cumsum(steps, axis=0)
+    # the sum of all segments before each snake
+    previous = positions[starts] - steps[starts]
+    positions -= np.repeat(previous, lengths, axis=0)
+    return np.split(positions, starts[1:])
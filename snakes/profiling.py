@@ -0,0 +1,172 @@
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Profile the moves of bots
+
+A `Profiler` is passed to `Game`, which then runs every move of a bot under `cProfile` and measures its latency. The
+profiles are kept per bot name, so the results of many games, also from different worker processes, can be merged
+with `Profiler.merge`. `write_profiles` writes one file per bot in the format of `pstats`, which can be inspected
+with `python -m pstats FILE` or tools like snakeviz.
+
+The latency of a move is measured while it is profiled, so it includes the overhead of cProfile on every function call
+of the bot. The latencies are inflated, by more for bots that make many small calls, and are only meant to compare
+moves and bots with each other. Play without profiling for the real time of the moves.
+
+A `Profiler` must not be used by more than one thread at once, a profile can only be enabled once.
+"""
+
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import re
+from collections import defaultdict
+from tempfile import gettempdir
+from time import perf_counter_ns
+
+import numpy as np
+
+LATENCY_PERCENTILES = (50, 95, 99)
+
+
+class Profiler:
+    def __init__(self):
+        self.profiles = {}  # map from bot name to cProfile.Profile, for the moves in this process
+        self.stats = defaultdict(dict)  # map from bot name to merged pstats data of other profilers
+        self.latencies = defaultdict(list)  # map from bot name to the duration of every move in nanoseconds
+
+    def call(self, name, function, **arguments):
+        """
+        Call `function(**arguments)` under the profile of a bot, and record its latency including the profiling overhead
+        """
+        if name not in self.profiles:
+            self.profiles[name] = cProfile.Profile()
+        profile = self.profiles[name]
+        start = perf_counter_ns()
+        profile.enable()
+        try:
+            return function(**arguments)
+        finally:
+            profile.disable()
+            self.latencies[name].append(perf_counter_ns() - start)
+
+    def results(self):
+        """
+        :return: Dict from bot name to (pstats data, latencies), which can be pickled and passed to `merge`
+        """
+        stats = {name: dict(data) for name, data in self.stats.items()}
+        for name, profile in self.profiles.items():
+            profile.create_stats()
+            merge_stats(stats.setdefault(name, {}), profile.stats)
+        return {name: (stats.get(name, {}), list(self.latencies[name])) for name in self.latencies}
+
+    def merge(self, results):
+        """
+        :param results: `results` of another profiler
+        """
+        for name, (stats, latencies) in results.items():
+            merge_stats(self.stats[name], stats)
+            self.latencies[name] += latencies
+
+
+def merge_stats(target, source):
+    """
+    Add pstats data, a dict from function to (primitive calls, calls, total time, cumulative time, callers)
+    """
+    for function, stat in source.items():
+        if function in target:
+            target[function] = pstats.add_func_stats(target[function], stat)
+        else:
+            target[function] = stat
+
+
+def latency_percentiles(latencies):
+    """
+    :param latencies: Durations in nanoseconds
+    :return: Dict from 'p50', 'p95', 'p99' and 'max' to the duration in milliseconds
+    """
+    latencies = np.asarray(latencies, dtype=float) / 1e6
+    if len(latencies) == 0:
+        return {key: np.nan for key in [f'p{p}' for p in LATENCY_PERCENTILES] + ['max']}
+    percentiles = dict(zip([f'p{p}' for p in LATENCY_PERCENTILES], np.percentile(latencies, LATENCY_PERCENTILES)))
+    percentiles['max'] = latencies.max()
+    return percentiles
+
+
+def profile_path(directory, prefix, name):
+    return os.path.join(directory, f'{prefix}_profile_{re.sub(r"[^A-Za-z0-9_.-]", "_", name)}.prof')
+
+
+def write_profiles(profiler, directory, prefix):
+    """
+    Write the merged profile of every bot to a file, and the latency percentiles to a CSV file
+
+    :return: Dict from bot name to the path of its profile
+    """
+    paths = {}
+    results = profiler.results()
+    for name, (stats, _) in results.items():
+        paths[name] = profile_path(directory, prefix, name)
+        with open(paths[name], 'wb') as f:
+            marshal.dump(stats, f)
+
+    with open(os.path.join(directory, f'{prefix}_latency.csv'), 'w') as f:
+        f.write('name,moves,' + ','.join(f'p{p}_ms' for p in LATENCY_PERCENTILES) + ',max_ms\n')
+        for name, (_, latencies) in results.items():
+            values = ','.join(f'{value:.3f}' for value in latency_percentiles(latencies).values())
+            f.write(f'{name},{len(latencies)},{values}\n')
+    return paths
+
+
+def print_profile_report(profiler, functions=10):
+    """
+    Print the latency percentiles of every bot, and the functions with the most cumulative time
+
+    :param functions: Amount of functions per bot
+    """
+    results = profiler.results()
+    print('Latencies include the overhead of the profiler')
+    print(f'{"Latency (ms)":20} {"Moves":>8}' + ''.join(f'{f"p{p}":>9}' for p in LATENCY_PERCENTILES) + f'{"max":>9}')
+    for name, (_, latencies) in sorted(results.items()):
+        percentiles = latency_percentiles(latencies)
+        print(f'{name:20} {len(latencies):>8}' + ''.join(f'{value:>9.3f}' for value in percentiles.values()))
+
+    for name, (stats, _) in sorted(results.items()):
+        if not stats:
+            continue
+        output = io.StringIO()
+        report = pstats.Stats(StatsData(stats), stream=output)
+        report.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(functions)
+        print()
+        print(f'Profile of {name}:')
+        # skip the header of pstats, which refers to a file
+        print(output.getvalue().strip('\n').split('\n', 1)[-1])
+
+
+def report_profiles(profiler, prefix, directory=None):
+    """
+    Print the report of `print_profile_report` and write the files of `write_profiles`
+
+    :param directory: By default the temporary directory
+    """
+    print_profile_report(profiler)
+    paths = write_profiles(profiler, gettempdir() if directory is None else directory, prefix)
+    print()
+    print('profiles were written to:')
+    for path in paths.values():
+        print(f'  {path}')
+
+
+class StatsData:
+    """
+    pstats data in the form that `pstats.Stats` accepts
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
@@ -0,0 +1,194 @@
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import math
+from functools import lru_cache
+
+import numpy as np
+import pygame
+
+BLACK = (0, 0, 0)
+GRAY = (64, 64, 64)
+WHITE = (255, 255, 255)
+
+COLOURS = [
+    (230, 25, 75),
+    (60, 180, 75),
+    (255, 225, 25),
+    (0, 130, 200),
+    (245, 130, 48),
+    (145, 30, 180),
+    (70, 240, 240),
+    (240, 50, 230),
+    (210, 245, 60),
+    (250, 190, 212),
+    (0, 128, 128),
+    (220, 190, 255),
+    (170, 110, 40),
+    (255, 250, 200),
+    (128, 0, 0),
+    (170, 255, 195),
+    (128, 128, 0),
+    (255, 215, 180),
+    (0, 0, 128),
+    (128, 128, 128),
+]
+
+
+@lru_cache(maxsize=None)
+def system_font(size):
+    # looking up a system font is slow, so only do it once per size
+    return pygame.font.SysFont(None, size)
+
+
+class ArenaRenderer:
+    """
+    Draw the snakes and candies of a game on a surface, from the bottom left corner
+
+    The background and the dead snakes are drawn on a cached layer, which is only redrawn when a snake dies. Of the live
+    snakes and candies, only the cells of which the drawing changed since the previous call are redrawn.
+    """
+
+    def __init__(self, surface, height, sprite):
+        """
+        :param height: Height of the surface in pixels
+        :param sprite: Image of a candy
+        """
+        self.surface = surface
+        self.height = height
+        self.sprite = sprite
+        self.layer = pygame.Surface(surface.get_size())
+        self.key = None  # what the layer shows
+        self.cells = None  # map from cell to what was drawn in it, None to redraw everything
+        self.scaled_sprites = {}  # map from tile size to the scaled sprite
+
+    def set_sprite(self, sprite):
+        self.sprite = sprite
+        self.scaled_sprites = {}
+        self.key = None
+
+    def draw(self, frame):
+        """
+        :param frame: Anything with the grid_size, snakes, dead_snakes and candies of a game, like a `State`
+        :return: The rectangles of the surface that changed
+        """
+        tile_size = math.floor(min(self.surface.get_size()) / frame.grid_size[1])
+        arena = pygame.Rect(0, self.height - frame.grid_size[1] * tile_size, frame.grid_size[0] * tile_size,
+                            frame.grid_size[1] * tile_size)
+
+        key = (tile_size, frame.grid_size, [(s.id, s.positions.tobytes()) for s in frame.dead_snakes])
+        if key != self.key:
+            self.key = key
+            self.layer.fill(BLACK)
+            for snake in frame.dead_snakes:
+                for _, shape in self.snake_shapes(snake, tile_size):
+                    self.draw_shape(self.layer, shape, tile_size)
+            self.cells = None
+
+        # what to draw, and which cells each shape overlaps
+        shapes = []
+        for snake in frame.snakes:
+            if snake is not None:
+                shapes += self.snake_shapes(snake, tile_size)
+        shapes += [([(candy[0], candy[1])], ('sprite', (candy[0], candy[1]))) for candy in frame.candies]
+        cells = {}
+        for overlapped, shape in shapes:
+            for cell in overlapped:
+                cells.setdefault((int(cell[0]), int(cell[1])), []).append(shape)
+
+        if self.cells is None:
+            self.surface.blit(self.layer, arena, area=arena)
+            for _, shape in shapes:
+                self.draw_shape(self.surface, shape, tile_size)
+            self.cells = cells
+            return [arena]
+
+        dirty = []
+        for cell in cells.keys() | self.cells.keys():
+            if cells.get(cell) == self.cells.get(cell):
+                continue
+            rect = pygame.Rect(cell[0] * tile_size, self.height - (cell[1] + 1) * tile_size, tile_size, tile_size)
+            self.surface.set_clip(rect)
+            self.surface.blit(self.layer, rect, area=rect)
+            for shape in cells.get(cell, []):
+                self.draw_shape(self.surface, shape, tile_size)
+            dirty.append(rect)
+        self.surface.set_clip(None)
+        self.cells = cells
+        return dirty
+
+    def snake_shapes(self, snake, tile_size):
+        """
+        :return: List of (overlapped cells, shape) to draw a snake, in drawing order
+        """
+        body_size = math.floor(tile_size * 0.7)
+        head_radius = int(tile_size * 0.9 / 2)
+        eye_radius = int(tile_size * 0.4 / 2)
+
+        def center(position):
+            return int((position[0] + 0.5) * tile_size), self.height - (int((position[1] + 0.5) * tile_size))
+
+        def cell(position):
+            return int(position[0]), int(position[1])
+
+        shapes = []
+        previous_pos = None
+        body_colour = COLOURS[snake.id] if not snake.dead else GRAY
+        for index, position in reversed(list(enumerate(snake))):
+            if index == 0:
+                # Neck drawn first so head goes on top, as it should
+                shapes.append(([cell(position), cell(previous_pos)],
+                               ('line', body_colour, center(position), center(previous_pos), body_size)))
+
+                # Is head
+                shapes.append(([cell(position)], ('circle', COLOURS[snake.id], center(position), head_radius)))
+
+                # Draw eyes
+                eye_offsets = [
+                    np.array([int(0.3 * tile_size), (int(-0.25 * tile_size))]),
+                    np.array([int(0.3 * tile_size), (int(0.25 * tile_size))])
+                ]  # Assuming going right
+                last_move_direction = position - snake[1]
+                last_move_angle = math.atan2(last_move_direction[1], last_move_direction[0])
+                for eye_offset in eye_offsets:
+                    corrected_eye_offset = rotate_vector(eye_offset, last_move_angle)
+                    shapes.append(([cell(position)], ('circle', WHITE, (
+                        int((position[0] + 0.5) * tile_size + corrected_eye_offset[0]),
+                        int((self.height - (position[1] + 0.5) * tile_size) - corrected_eye_offset[1]),
+                    ), eye_radius)))
+                    corrected_eye_offset[np.argmax(np.abs(corrected_eye_offset))] *= 1.3
+                    shapes.append(([cell(position)], ('circle', BLACK, (
+                        int((position[0] + 0.5) * tile_size + corrected_eye_offset[0]),
+                        int(self.height - (int((position[1] + 0.5) * tile_size)) - corrected_eye_offset[1]),
+                    ), eye_radius // 2)))
+
+                previous_pos = position
+
+            else:
+                # Is body
+                if previous_pos is not None:
+                    shapes.append(([cell(position), cell(previous_pos)],
+                                   ('line', body_colour, center(position), center(previous_pos), body_size)))
+                shapes.append(([cell(position)],
+                               ('circle', body_colour, center(position), (body_size // 2) - 1)))  # Don't ask me why -1
+                previous_pos = position
+        return shapes
+
+    def draw_shape(self, surface, shape, tile_size):
+        kind, *arguments = shape
+        if kind == 'line':
+            pygame.draw.line(surface, *arguments)
+        elif kind == 'circle':
+            pygame.draw.circle(surface, *arguments)
+        elif kind == 'sprite':
+            if tile_size not in self.scaled_sprites:
+                self.scaled_sprites[tile_size] = pygame.transform.scale(self.sprite, (tile_size, tile_size))
+            x, y = arguments[0]
+            surface.blit(self.scaled_sprites[tile_size], (int(x * tile_size), self.height - int((y + 1) * tile_size)))
+
+
+def rotate_vector(vector, angle):
+    x = vector[0] * math.cos(angle) - vector[1] * math.sin(angle)
+    y = vector[0] * math.sin(angle) + vector[1] * math.cos(angle)
+    return np.array([x, y])
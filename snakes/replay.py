@@ -1,31 +1,417 @@
+import json
+import re
+from hashlib import blake2b
+from collections.abc import Sequence
+from itertools import zip_longest
 from typing import Tuple
 
-from .game import RoundType, GameHistory, State
+import numpy as np
+
+from . import replay_binary
+from .game import RoundType, GameEvent, GameHistory, State, describe_event, deserialize, deserialize_snake, \
+    rank_scores, serialize_snake
+
+REPLAY_FORMATS = ('yaml', 'jsonl', 'binary')
+
+# libyaml does not accept an infinite line width
+YAML_WIDTH = 2 ** 31 - 1
 
 
 class ReplayReader:
+    """
+    Re-simulate a replay
+
+    The replay can contain keyframes: snapshots of the state at the start of every so many turns, see `add_keyframes`.
+    `seek` restores the nearest keyframe and only re-simulates the moves after it.
+    """
+
     def __init__(self, doc):
+        self.initial = doc['initial']
         self.history = GameHistory.deserialize(doc)
+        self.keyframes = {keyframe['step']: keyframe for keyframe in doc.get('keyframes', [])}
+        self.step = 0  # index into the history of the next action
+        self.last_move_turns = None  # value of state.turns before the last move
         self.state = State(self.history.initial_snakes, self.history.grid_size, RoundType.TURNS,
                            self.history.initial_candies)
 
     def all_events(self):
-        for id_to_move_value in self.history.history:
-            if isinstance(id_to_move_value, Tuple):
-                self.state.spawn_candy(*id_to_move_value)
-            else:
-                moves = []
-                for s in self.state.snakes:
-                    try:
-                        move_value = id_to_move_value[s.id]
-                        moves.append((s, move_value))
-                    except KeyError as e:
-                        pass
-                for event in self.state.do_moves(moves):
-                    yield event
-                yield self.state
+        while self.step < len(self.history.history):
+            yield from self._do_step()
+
+    def _do_step(self):
+        id_to_move_value = self.history.history[self.step]
+        self.step += 1
+        if isinstance(id_to_move_value, Tuple):
+            self.state.spawn_candy(*id_to_move_value)
+        else:
+            moves = []
+            for s in self.state.snakes:
+                if s is not None and s.id in id_to_move_value:
+                    moves.append((s, id_to_move_value[s.id]))
+            self.last_move_turns = self.state.turns
+            for event in self.state.do_moves(moves):
+                yield event
+            yield self.state
 
     def states(self):
         for event in self.all_events():
             if isinstance(event, State):
                 yield event
+
+    def positions(self):
+        """
+        Iterate over the states in which snakes have to move, before they move
+
+        :return: Iterator of (state, dict from snake index to the recorded move)
+        """
+        while self.step < len(self.history.history):
+            action = self.history.history[self.step]
+            if not isinstance(action, Tuple):
+                yield self.state, action
+            for _ in self._do_step():
+                pass
+
+    def seek(self, turn):
+        """
+        Go to the start of a turn: after the candies have been spawned and before the first move of that turn
+
+        :param turn: Compared to `State.turns`
+        :return: The state
+        """
+        # continue from the current state if that did not pass the start of the turn yet, and no keyframe is closer
+        usable = self.state.turns < turn or (self.state.turns == turn and self.last_move_turns != turn)
+        current = self.step if usable else -1
+        candidates = [step for step, keyframe in self.keyframes.items() if keyframe['turns'] <= turn and step > current]
+        if candidates:
+            self.restore(self.keyframes[max(candidates)])
+        elif not usable:
+            self.restart()
+
+        while self.step < len(self.history.history):
+            if not isinstance(self.history.history[self.step], Tuple) and self.state.turns >= turn:
+                break
+            for _ in self._do_step():
+                pass
+        return self.state
+
+    def restart(self):
+        grid_size, candies, _, snakes = deserialize(self.initial)
+        self.state = State(snakes, grid_size, RoundType.TURNS, candies)
+        self.step = 0
+        self.last_move_turns = None
+
+    def snapshot(self):
+        """
+        :return: The current state as a keyframe
+        """
+        state = self.state
+        return {
+            'step': self.step,
+            'turn': state.turn,
+            'turns': state.turns,
+            'candies': [[int(x), int(y)] for x, y in state.candies],
+            'snakes': [None if snake is None else serialize_snake(snake) for snake in state.snakes],
+            'dead': [[snake.id, serialize_snake(snake)] for snake in state.dead_snakes],
+            'scores': [[id, score] for id, score in state.scores.items()],
+        }
+
+    def restore(self, keyframe):
+        snakes = [None if data is None else deserialize_snake(id, data) for id, data in enumerate(keyframe['snakes'])]
+        candies = [np.array(candy) for candy in keyframe['candies']]
+        state = State([snake for snake in snakes if snake is not None], self.history.grid_size, RoundType.TURNS,
+                      candies)
+        state.snakes = snakes
+        state.turn = keyframe['turn']
+        state.turns = keyframe['turns']
+        for id, data in keyframe['dead']:
+            snake = deserialize_snake(id, data)
+            snake.dead = True
+            state.dead_snakes.append(snake)
+        state.scores = {id: score for id, score in keyframe['scores']}
+
+        self.state = state
+        self.step = keyframe['step']
+        self.last_move_turns = None
+
+    def create_keyframes(self, interval):
+        """
+        Play the whole replay and take a keyframe at the start of every `interval` turns
+
+        :return: The keyframes
+        """
+        self.restart()
+        self.keyframes = {}
+        while self.step < len(self.history.history):
+            turns = self.state.turns
+            for _ in self._do_step():
+                pass
+            if self.state.turns != turns and self.state.turns % interval == 0:
+                self.keyframes[self.step] = self.snapshot()
+        return list(self.keyframes.values())
+
+
+def verify_replay(doc):
+    """
+    Re-simulate a replay and compare the outcome with what was recorded: the final ranking, and if available the amount
+    of turns and the events
+
+    :return: Descriptions of the differences, empty if the replay reproduces
+    """
+    reader = ReplayReader(doc)
+    try:
+        events = [describe_event(event, reader.state.turns) for event in reader.all_events()
+                  if isinstance(event, GameEvent)]
+    except Exception as e:
+        return [f're-simulation raised {e!r}']
+
+    differences = []
+    scores = sorted(((score, id) for id, score in reader.state.scores.items()), reverse=True)
+    ranking = rank_scores(scores) if scores else {}
+    rank = [ranking.get(i) for i in range(len(doc['agents']))]
+    if rank != doc['rank']:
+        differences.append(f'rank {doc["rank"]} became {rank}')
+    if 'turns' in doc and doc['turns'] != reader.state.turns:
+        differences.append(f'turns {doc["turns"]} became {reader.state.turns}')
+    if 'events' in doc and doc['events'] != events:
+        i = next(i for i, (a, b) in enumerate(zip_longest(doc['events'], events)) if a != b)
+        recorded = doc['events'][i] if i < len(doc['events']) else None
+        replayed = events[i] if i < len(events) else None
+        differences.append(f'event {i} {recorded!r} became {replayed!r}')
+    return differences
+
+
+def recorded_positions(doc):
+    """
+    Re-simulate a replay and yield every position in which a snake had to move
+
+    A position is a tuple (grid_size, candies, id, snakes), with `id` the snake that moves and `snakes` tuples of
+    (id, serialized snake) of all live snakes. It is hashable and cheap to send to other processes.
+
+    :return: Iterator of (position, recorded move)
+    """
+    reader = ReplayReader(doc)
+    for state, action in reader.positions():
+        candies = tuple((int(x), int(y)) for x, y in state.candies)
+        snakes = tuple((s.id, serialize_snake(s)) for s in state.snakes if s is not None)
+        for s in state.snakes:
+            if s is not None and s.id in action:
+                yield (reader.history.grid_size, candies, s.id, snakes), action[s.id]
+
+
+def position_arguments(position):
+    """
+    :param position: As yielded by `recorded_positions`
+    :return: The keyword arguments for `Bot.determine_next_move` in this position
+    """
+    _, candies, id, snakes = position
+    snakes = [deserialize_snake(i, data) for i, data in snakes]
+    return {
+        'snake': next(s for s in snakes if s.id == id),
+        'other_snakes': [s for s in snakes if s.id != id],
+        'candies': [np.array(candy) for candy in candies],
+    }
+
+
+def position_hash(position) -> bytes:
+    return blake2b(repr(position).encode(), digest_size=16).digest()
+
+
+def add_keyframes(doc, interval):
+    """
+    :return: A copy of the replay with a keyframe at the start of every `interval` turns
+    """
+    doc = dict(doc)
+    doc['keyframes'] = ReplayReader(doc).create_keyframes(interval)
+    return doc
+
+
+class ReplayWriter:
+    """
+    Write replays to a file, together with an index to find each replay without parsing the ones before it
+
+    Writes are buffered, call `flush` to make sure that everything written so far is on disk.
+    """
+
+    def __init__(self, path, format='yaml', buffer_size=1 << 20):
+        """
+        :param format: 'yaml' for a multi-document YAML file, 'jsonl' for one JSON document per line, 'binary' for
+                       the compact format of `snakes.replay_binary`
+        :param buffer_size: Size in bytes of the write buffer
+        """
+        assert format in REPLAY_FORMATS, format
+        self.format = format
+        self.file = open(path, 'wb', buffering=buffer_size)
+        self.index = open(index_path(path), 'w', buffering=buffer_size)
+        if format == 'binary':
+            self.file.write(replay_binary.MAGIC)
+
+    def write(self, doc, **metadata):
+        """
+        :param doc: The replay, see `Game.save_replay`
+        :param metadata: Extra information to store in the index, like the seed and amount of turns
+        """
+        entry = {'offset': self.file.tell(), 'agents': doc['agents'], 'rank': doc['rank']}
+        if self.format == 'binary':
+            entry['length'] = replay_binary.write_record(self.file, doc)
+        else:
+            if self.format == 'jsonl':
+                data = (json.dumps(doc, separators=(',', ':')) + '\n').encode()
+            else:
+                import yaml
+
+                data = yaml.dump(doc, Dumper=_yaml_class('Dumper'), default_flow_style=True, width=YAML_WIDTH,
+                                 explicit_start=True).encode()
+            self.file.write(data)
+            entry['length'] = len(data)
+        entry.update(metadata)
+        self.index.write(json.dumps(entry) + '\n')
+
+    def flush(self):
+        self.file.flush()
+        self.index.flush()
+
+    def close(self):
+        self.file.close()
+        self.index.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ReplayArchive(Sequence):
+    """
+    Random access to the replays in a file written by `ReplayWriter`
+
+    Files without an index (like the ones of older tournaments) are scanned once to build it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.format = replay_format(path)
+        try:
+            with open(index_path(path)) as f:
+                self.index = [json.loads(line) for line in f]
+        except FileNotFoundError:
+            self.index = list(self._scan())
+
+    def _scan(self):
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        if self.format == 'binary':
+            offsets = [len(replay_binary.MAGIC)]
+            while offsets[-1] < len(data):
+                length, start = replay_binary.read_varint(data, offsets[-1])
+                offsets.append(start + length)
+        elif self.format == 'jsonl':
+            offsets = [0] + [m.end() for m in re.finditer(rb'\n', data)] + [len(data)]
+        else:
+            offsets = [0] + [m.start() + 1 for m in re.finditer(rb'\n---', data)] + [len(data)]
+        for offset, end in zip(offsets, offsets[1:]):
+            doc = self._load(offset, end - offset)
+            if doc is not None:
+                yield {'offset': offset, 'length': end - offset, 'agents': doc['agents'], 'rank': doc['rank']}
+
+    def _load(self, offset, length):
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+        if self.format == 'binary':
+            return replay_binary.read_record(data)
+        elif self.format == 'jsonl':
+            return json.loads(data) if data.strip() else None
+        import yaml
+
+        return yaml.load(data, Loader=_yaml_class('Loader'))
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        entry = self.index[i]
+        return self._load(entry['offset'], entry['length'])
+
+    def select(self, bot=None, opponent=None, outcome=None):
+        """
+        Find replays by the bots that played and the result
+
+        :param bot: Name of a bot that played
+        :param opponent: Name of a bot that played against `bot`
+        :param outcome: 'win', 'loss' or 'draw', as seen from `bot`
+        :return: The indices of the matching replays
+        """
+        assert outcome is None or bot is not None, 'an outcome is relative to a bot'
+        selection = []
+        for i, entry in enumerate(self.index):
+            agents = entry['agents']
+            if bot is not None and bot not in agents:
+                continue
+            if opponent is not None:
+                others = list(agents)
+                if bot is not None:
+                    others.remove(bot)
+                if opponent not in others:
+                    continue
+            if outcome is not None and match_outcome(entry['rank'], agents.index(bot)) != outcome:
+                continue
+            selection.append(i)
+        return selection
+
+
+def match_outcome(rank, index):
+    """
+    :param rank: Final rank of each snake in the match
+    :param index: The snake to get the outcome for
+    :return: 'win', 'loss' or 'draw'
+    """
+    if rank[index] != 1:
+        return 'loss'
+    if sum(1 for r in rank if r == 1) > 1:
+        return 'draw'
+    return 'win'
+
+
+def index_path(path):
+    return f'{path}.idx'
+
+
+def read_replays(path):
+    """
+    Iterate over all replays in a file, in any of the `REPLAY_FORMATS`
+    """
+    format = replay_format(path)
+    if format == 'binary':
+        with open(path, 'rb') as f:
+            yield from replay_binary.read_replays(f)
+    elif format == 'jsonl':
+        with open(path) as f:
+            yield from (json.loads(line) for line in f if line.strip())
+    else:
+        import yaml
+
+        with open(path) as f:
+            yield from yaml.load_all(f, Loader=_yaml_class('Loader'))
+
+
+def replay_format(path):
+    """
+    :return: The format of a replay file, one of `REPLAY_FORMATS`
+    """
+    with open(path, 'rb') as f:
+        start = f.read(len(replay_binary.MAGIC))
+    if start == replay_binary.MAGIC:
+        return 'binary'
+    # a YAML document in flow style starts with '{' too, but does not quote its keys
+    return 'jsonl' if start.lstrip().startswith(b'{"') else 'yaml'
+
+
+def _yaml_class(kind):
+    """
+    :param kind: 'Loader' or 'Dumper'
+    :return: The safe YAML loader or dumper, implemented in C by libyaml if available
+    """
+    import yaml
+
+    return getattr(yaml, f'CSafe{kind}', getattr(yaml, f'Safe{kind}'))
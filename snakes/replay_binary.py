@@ -0,0 +1,222 @@
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Compact binary encoding of replays
+
+A replay file starts with `MAGIC`, followed by one record per replay. A record is prefixed by its length as a varint
+and contains:
+
+1. A header: the length as a varint followed by the JSON encoded replay without its moves. It contains the initial
+   state as produced by `serialize()`, the agents and the ranking.
+2. Blocks with the moves and candy spawns. Each block starts with a varint tag `count << 2 | kind`:
+   - `CYCLE`: the order in which snakes move changed. Followed by `count` varints with the snake indices
+   - `MOVES`: `count` moves, continuing the current cycle. Packed with 2 bits per move, 4 moves per byte
+   - `CANDIES`: `count` candy spawns, each a varint x and a varint y
+"""
+
+import json
+from io import BytesIO
+
+import numpy as np
+
+MAGIC = b'SNKR\x01'
+
+CYCLE = 0
+MOVES = 1
+CANDIES = 2
+
+MOVE_CHARACTERS = 'udlr'
+
+
+def write_varint(out: bytearray, value: int):
+    assert value >= 0
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset: int):
+    """
+    :return: The value and the offset after it
+    """
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def parse_moves(moves: str):
+    """
+    Split the moves string of `GameHistory.serialize` in runs of moves and candy spawns
+
+    :return: List of ('moves', snake indices, move characters) and ('candies', [(x, y), ...]) tuples
+    """
+    runs = []
+    for token in moves.split():
+        if token.startswith('c'):
+            x, y = token[1:].split(',')
+            if not runs or runs[-1][0] != 'candies':
+                runs.append(('candies', []))
+            runs[-1][1].append((int(x), int(y)))
+        else:
+            if not runs or runs[-1][0] != 'moves':
+                runs.append(('moves', [], []))
+            runs[-1][1].append(int(token[:-1]))
+            runs[-1][2].append(token[-1])
+    return runs
+
+
+def pack_moves(characters):
+    codes = np.array([MOVE_CHARACTERS.index(c) for c in characters], dtype=np.uint8)
+    codes = np.pad(codes, (0, -len(codes) % 4)).reshape(-1, 4)
+    return (codes[:, 0] | codes[:, 1] << 2 | codes[:, 2] << 4 | codes[:, 3] << 6).astype(np.uint8).tobytes()
+
+
+def unpack_moves(data: bytes, count: int):
+    packed = np.frombuffer(data, dtype=np.uint8)
+    return ((packed[:, None] >> np.array([0, 2, 4, 6], dtype=np.uint8)) & 3).ravel()[:count]
+
+
+def encode(doc) -> bytes:
+    """
+    Encode a replay, as returned by `Game.save_replay`, to bytes
+    """
+    out = bytearray()
+    header = {key: value for key, value in doc.items() if key != 'moves'}
+    header = json.dumps(header, separators=(',', ':')).encode()
+    write_varint(out, len(header))
+    out += header
+
+    cycle = []
+    position = 0  # index into the cycle of the next snake to move
+    for run in parse_moves(doc['moves']):
+        if run[0] == 'candies':
+            write_varint(out, len(run[1]) << 2 | CANDIES)
+            for x, y in run[1]:
+                write_varint(out, x)
+                write_varint(out, y)
+            continue
+
+        _, indices, characters = run
+        start = 0
+        while start < len(indices):
+            # extend the moves as long as they follow the current cycle
+            end = start
+            while end < len(indices) and cycle and indices[end] == cycle[(position + end - start) % len(cycle)]:
+                end += 1
+            if end > start:
+                write_varint(out, (end - start) << 2 | MOVES)
+                out += pack_moves(characters[start:end])
+                position = (position + end - start) % len(cycle)
+                start = end
+                continue
+
+            # the order changed, the new cycle runs until the first snake moves again
+            end = start + 1
+            while end < len(indices) and indices[end] not in indices[start:end]:
+                end += 1
+            cycle = indices[start:end]
+            position = 0
+            write_varint(out, len(cycle) << 2 | CYCLE)
+            for index in cycle:
+                write_varint(out, index)
+    return bytes(out)
+
+
+def decode(data: bytes):
+    """
+    Decode bytes produced by `encode` back to a replay
+    """
+    length, offset = read_varint(data, 0)
+    doc = json.loads(data[offset:offset + length])
+    offset += length
+
+    tokens = []
+    cycle = []
+    position = 0
+    while offset < len(data):
+        tag, offset = read_varint(data, offset)
+        count, kind = tag >> 2, tag & 3
+        if kind == CYCLE:
+            cycle = []
+            for _ in range(count):
+                index, offset = read_varint(data, offset)
+                cycle.append(index)
+            position = 0
+        elif kind == MOVES:
+            size = (count + 3) // 4
+            codes = unpack_moves(data[offset:offset + size], count)
+            offset += size
+            tokens += [f'{cycle[(position + i) % len(cycle)]}{MOVE_CHARACTERS[code]}' for i, code in enumerate(codes)]
+            position = (position + count) % len(cycle)
+        elif kind == CANDIES:
+            for _ in range(count):
+                x, offset = read_varint(data, offset)
+                y, offset = read_varint(data, offset)
+                tokens.append(f'c{x},{y}')
+        else:
+            raise ValueError(f'Unknown block kind {kind}')
+
+    doc['moves'] = ' '.join(tokens)
+    return doc
+
+
+def write_record(stream, doc):
+    """
+    Append a replay to a binary replay file, which should already start with `MAGIC`
+
+    :return: The amount of bytes written
+    """
+    record = encode(doc)
+    prefix = bytearray()
+    write_varint(prefix, len(record))
+    stream.write(prefix)
+    stream.write(record)
+    return len(prefix) + len(record)
+
+
+def read_record(data: bytes):
+    """
+    Decode a single length prefixed record, as written by `write_record`
+    """
+    length, offset = read_varint(data, 0)
+    return decode(data[offset:offset + length])
+
+
+def read_replays(stream):
+    """
+    Iterate over the replays of a binary replay file, without loading the whole file
+    """
+    if stream.read(len(MAGIC)) != MAGIC:
+        raise ValueError('Not a binary replay file')
+    while True:
+        prefix = bytearray()
+        while True:
+            byte = stream.read(1)
+            if not byte:
+                if prefix:
+                    raise EOFError('Truncated replay file')
+                return
+            prefix += byte
+            if byte[0] < 0x80:
+                break
+        length, _ = read_varint(prefix, 0)
+        yield decode(stream.read(length))
+
+
+def dumps(docs) -> bytes:
+    """
+    Encode replays to the contents of a binary replay file
+    """
+    stream = BytesIO()
+    stream.write(MAGIC)
+    for doc in docs:
+        write_record(stream, doc)
+    return stream.getvalue()
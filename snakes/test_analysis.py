@@ -0,0 +1,94 @@
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import numpy as np
+import pytest
+
+from .analysis import BoardAnalysis, analyse
+from .bot import Bot
+from .constants import Move
+from .snake import Snake
+
+
+class Analyser(Bot):
+    @property
+    def name(self):
+        return 'Analyser'
+
+    @property
+    def contributor(self):
+        return 'Nobleo'
+
+    def determine_next_move(self, snake, other_snakes, candies):
+        return analyse(self, snake, other_snakes, candies).free_moves()[0]
+
+
+def make_board():
+    # a wall of snake 1 at x = 2, with a gap at the top, and snake 0 to the left of it
+    #   y=3  . . . .
+    #   y=2  0 . 1 .
+    #   y=1  0 . 1 .
+    #   y=0  . . 1 .
+    own = Snake(0, np.array([[0, 2], [0, 1]]))
+    wall = Snake(1, np.array([[2, 2], [2, 1], [2, 0]]))
+    return BoardAnalysis((4, 4), [own, wall], [np.array([3, 0])])
+
+
+def test_occupancy():
+    board = make_board()
+    assert board.owner[0, 2] == 0 and board.owner[2, 0] == 1 and board.owner[1, 1] == -1
+    # the tail is free after one move
+    assert board.time_to_free[2, 2] == 3 and board.time_to_free[2, 0] == 1 and board.time_to_free[0, 1] == 1
+    assert board.free_moves() == [Move.UP, Move.RIGHT]
+
+
+def test_flood_fill():
+    board = make_board()
+    assert board.reachable_area((0, 2)) == 16 - 5
+    assert board.cached(('reachable_area', (0, 2)), lambda: None) == 16 - 5
+
+    closed = BoardAnalysis((4, 4), [Snake(1, np.array([[2, 3], [2, 2], [2, 1], [2, 0]]))], [])
+    assert closed.reachable_area((0, 0)) == 8
+    assert not closed.flood_fill((0, 0))[3, 0]
+
+
+def test_distances():
+    board = make_board()
+    distances = board.distances([(0, 2)])
+    assert distances[0, 2] == 0
+    assert distances[1, 2] == 1
+    assert distances[3, 0] == 7  # around the wall, through the gap
+    assert distances[2, 1] == -1
+
+    # through the tail of the wall, which is free after one move
+    assert board.distances([(0, 2)], wait_for_tails=True)[3, 0] == 5
+
+
+def test_voronoi():
+    board = BoardAnalysis((5, 1), [Snake(0, np.array([[0, 0]])), Snake(1, np.array([[4, 0]]))], [])
+    assert board.voronoi().tolist() == [[0], [0], [-1], [1], [1]]
+    assert board.territory() == [2, 2]
+
+
+def test_read_only():
+    board = make_board()
+    with pytest.raises(ValueError):
+        board.owner[3, 3] = 1
+    distances = board.distances([(0, 2)])
+    with pytest.raises(ValueError):
+        distances[0, 0] = 0
+    assert board.distances([(0, 2)]) is distances
+
+
+def test_analyse_cache():
+    snake = Snake(0, np.array([[1, 1], [1, 0]]))
+    bot, other_bot = Analyser(id=0, grid_size=(4, 4)), Analyser(id=0, grid_size=(4, 4))
+    board = analyse(bot, snake, [], [])
+    assert analyse(bot, snake, [], []) is board
+    # every bot has its own analysis
+    assert analyse(other_bot, snake, [], []) is not board
+    snake.move(np.array([0, 1]))
+    assert analyse(bot, snake, [], []) is not board
+    assert board.heads[0].tolist() == [1, 1]
+    assert bot.determine_next_move(snake, [], []) == Move.UP
@@ -0,0 +1,76 @@
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import random
+
+import numpy as np
+import pytest
+
+from .board import Board
+from .bot import BoardBot
+from .constants import MOVES, Move
+from .game import Game
+from .test_replay import FirstFreeMove
+
+
+class FirstFreeBoardMove(BoardBot):
+    """
+    `FirstFreeMove` on a board
+    """
+
+    @property
+    def name(self):
+        return 'FirstFreeBoardMove'
+
+    @property
+    def contributor(self):
+        return 'Nobleo'
+
+    def determine_board_move(self, board):
+        legal = board.legal_moves[board.index(self.id)]
+        return MOVES[np.argmax(legal)] if legal.any() else Move.UP
+
+
+def assert_board_equal(board, state):
+    expected = Board(state.grid_size, state.snakes, state.candies, state.turns)
+    alive = expected.alive
+    assert np.array_equal(board.alive, alive)
+    assert np.array_equal(board.occupancy, expected.occupancy)
+    assert np.array_equal(board.heads[alive], expected.heads[alive])
+    assert np.array_equal(board.lengths, expected.lengths)
+    assert np.array_equal(board.candies, expected.candies)
+    assert np.array_equal(board.legal_moves, expected.legal_moves)
+    assert board.turns == expected.turns
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_board_is_updated(seed):
+    random.seed(seed)
+    game = Game(agents={i: FirstFreeMove for i in range(3)}, grid_size=(8, 8))
+    board = game.state.board
+    while not game.finished():
+        list(game.update())
+        assert_board_equal(board, game.state)
+
+
+def test_board_is_read_only():
+    random.seed(0)
+    game = Game(agents={i: FirstFreeMove for i in range(2)}, grid_size=(8, 8))
+    with pytest.raises(ValueError):
+        game.state.board.occupancy[0, 0, 0] = True
+    with pytest.raises(AttributeError):
+        game.state.board.heads = None
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_board_bot(seed):
+    # a board bot plays the same game as the bot it was made from
+    docs = []
+    for Agent in (FirstFreeMove, FirstFreeBoardMove):
+        random.seed(seed)
+        game = Game(agents={i: Agent for i in range(3)}, grid_size=(8, 8))
+        while not game.finished():
+            list(game.update())
+        docs.append(game.save_replay())
+    assert docs[0]['moves'] == docs[1]['moves']
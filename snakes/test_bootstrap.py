@@ -0,0 +1,47 @@
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from io import StringIO
+
+import numpy as np
+
+from .bootstrap import bootstrap, confidence_interval
+from .elo import read_csv
+
+
+def test_bootstrap():
+    csv = """Bot1,Bot2,Bot3
+1,2
+1,2
+1,2
+2,1
+,1,2
+,1,2
+,2,1
+2,,1
+    """
+    ranking = read_csv(StringIO(csv)).to_numpy()
+    for method in ['least_squares', 'bradley_terry']:
+        elo, rate, winrate = bootstrap(ranking, samples=50, method=method, jobs=1, seed=1)
+        assert elo.shape == (50, 3)
+        assert rate.shape == (50, 3)
+        assert winrate.shape == (50, 3, 3)
+        assert np.allclose(np.mean(elo, axis=1), 1500)
+
+    low, high = confidence_interval(rate)
+    assert np.all(low <= [3 / 5, 3 / 7, 2 / 4])
+    assert np.all(high >= [3 / 5, 3 / 7, 2 / 4])
+
+    # the same seed gives the same resamples, regardless of the amount of processes
+    assert np.array_equal(bootstrap(ranking, samples=10, jobs=1, seed=2)[1],
+                          bootstrap(ranking, samples=10, jobs=2, seed=2)[1])
+
+    # only the win rates
+    elo, rate, winrate = bootstrap(ranking, samples=10, method=None, jobs=1, seed=2)
+    assert np.all(np.isnan(elo))
+    assert np.array_equal(rate, bootstrap(ranking, samples=10, jobs=1, seed=2)[1])
+
+    elo, rate, winrate = bootstrap(ranking, samples=0, jobs=1)
+    assert elo.shape == (0, 3)
+    assert winrate.shape == (0, 3, 3)
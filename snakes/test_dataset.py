@@ -0,0 +1,43 @@
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import numpy as np
+
+from .constants import MOVES
+from .dataset import export_dataset, load_dataset
+from .replay import ReplayWriter, position_arguments, recorded_positions
+from .test_replay import play_game
+
+
+def test_export_dataset(tmp_path):
+    docs = [play_game(seed, players=players, grid_size=(6, 7)) for seed, players in [(0, 2), (1, 3)]]
+    with ReplayWriter(tmp_path / 'replay.bin', format='binary') as writer:
+        for doc in docs:
+            writer.write(doc)
+
+    positions = export_dataset(tmp_path / 'replay.bin', tmp_path / 'dataset', jobs=1)
+    dataset = load_dataset(tmp_path / 'dataset')
+    assert isinstance(dataset['planes'], np.memmap)
+    assert dataset['planes'].shape == (positions, 4, 6, 7)
+
+    expected = [(i, position, move) for i, doc in enumerate(docs) for position, move in recorded_positions(doc)]
+    assert positions == len(expected)
+    for row, (i, position, move) in enumerate(expected):
+        assert dataset['replay'][row] == i
+        assert dataset['snake'][row] == position[2]
+        assert dataset['rank'][row] == docs[i]['rank'][position[2]]
+        assert MOVES[dataset['move'][row]] == move
+
+        # the snake that moves comes first, the candies last
+        arguments = position_arguments(position)
+        planes = dataset['planes'][row]
+        assert np.array_equal(np.argwhere(planes[0]), np.unique(arguments['snake'].positions, axis=0))
+        others = np.concatenate([s.positions for s in arguments['other_snakes']])
+        assert np.array_equal(np.argwhere(planes[1:-1].any(axis=0)), np.unique(others, axis=0))
+        assert planes[-1].sum() == len(arguments['candies'])
+
+    export_dataset(tmp_path / 'replay.bin', tmp_path / 'parallel', jobs=2)
+    parallel = load_dataset(tmp_path / 'parallel')
+    for name, array in dataset.items():
+        assert np.array_equal(parallel[name], array), name
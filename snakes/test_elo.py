@@ -3,11 +3,14 @@
 # SPDX-License-Identifier: Apache-2.0
 
 from io import StringIO
+from math import isnan
 from statistics import mean
 
-from pytest import approx
+import numpy as np
+from pytest import approx, raises
 
-from .elo import estimate_elo, read_csv
+from .elo import (OnlineRating, TournamentStats, bot_names, estimate_bradley_terry, estimate_elo, pairwise_counts,
+                  read_csv)
 
 
 def test_1v1():
@@ -22,7 +25,7 @@ def test_1v1():
     """
     df = read_csv(StringIO(csv))
     elos = estimate_elo(df)
-    assert elos[0] - elos[1] == approx(190.85, 1e-5)
+    assert elos.iloc[0] - elos.iloc[1] == approx(190.85, 1e-5)
     assert mean(elos) == approx(1500)
 
 
@@ -50,8 +53,8 @@ def test_3_player():
     """
     df = read_csv(StringIO(csv))
     elos = estimate_elo(df)
-    assert elos[0] - elos[1] == approx(190.85, 1e-5)
-    assert elos[1] - elos[2] == approx(190.85, 1e-5)
+    assert elos.iloc[0] - elos.iloc[1] == approx(190.85, 1e-5)
+    assert elos.iloc[1] - elos.iloc[2] == approx(190.85, 1e-5)
     assert mean(elos) == approx(1500)
 
 
@@ -74,3 +77,112 @@ def test_deathmatch():
     """
     df = read_csv(StringIO(csv))
     estimate_elo(df)
+
+
+def test_pairwise_counts():
+    csv = """Bot1,Bot2,Bot3
+1,2
+2,1
+1,1
+3,1,2
+    """
+    df = read_csv(StringIO(csv))
+    wins, draws = pairwise_counts(df.to_numpy())
+    assert wins.tolist() == [[0, 1, 0], [2, 0, 1], [1, 0, 0]]
+    assert draws.tolist() == [[0, 1, 0], [1, 0, 0], [0, 0, 0]]
+
+    # only neighbours in the ranking are compared
+    wins, draws = pairwise_counts(df.to_numpy(), adjacent=True)
+    assert wins.tolist() == [[0, 1, 0], [1, 0, 1], [1, 0, 0]]
+
+
+def test_bradley_terry_1v1():
+    csv = """Bot1,Bot2
+1,2
+1,2
+1,2
+2,1
+    """
+    df = read_csv(StringIO(csv))
+    elos = estimate_bradley_terry(df, prior=0)
+    assert elos.iloc[0] - elos.iloc[1] == approx(190.85, 1e-5)
+    assert mean(elos) == approx(1500)
+
+    # the prior pulls the ratings towards each other
+    elos = estimate_bradley_terry(df)
+    assert 0 < elos.iloc[0] - elos.iloc[1] < 190.85
+
+
+def test_bradley_terry_deathmatch():
+    csv = """Bot1,Bot2,Bot3,Bot4,Bot5,Bot6,Bot7
+5,3,4,1,2
+    """
+    df = read_csv(StringIO(csv))
+    elos = estimate_bradley_terry(df)
+    assert list(elos.iloc[:5].sort_values().index) == ['Bot1', 'Bot3', 'Bot2', 'Bot5', 'Bot4']
+    assert elos.iloc[5] == approx(elos.iloc[6])
+    assert mean(elos) == approx(1500)
+
+
+def test_online_rating():
+    csv = """Bot1,Bot2,Bot3
+1,2
+1,2
+2,1
+,1,2
+,2,1
+2,,1
+3,1,2
+    """
+    df = read_csv(StringIO(csv))
+    rating = OnlineRating(df.columns)
+    for _, row in df.iterrows():
+        rating.update({i: rank for i, rank in enumerate(row) if not isnan(rank)})
+        rating.fit()
+
+    assert rating.elo == approx(estimate_bradley_terry(df).to_numpy())
+    assert rating.played.tolist() == [5, 6, 4]
+    assert rating.won.tolist() == [2, 3, 2]
+    assert all(rating.errors > 0)
+
+
+def test_tournament_stats_chunks():
+    csv = """Bot1,Bot2,Bot3,turns,seed,cpu_Bot1,cpu_Bot2,cpu_Bot3
+1,2,,10,0,0.5,0.25,
+2,1,,20,0,0.5,0.25,
+,1,2,30,0,,0.5,1.0
+1,,2,40,0,1.0,,0.5
+3,1,2,50,0,1.0,1.0,1.0
+    """
+    df = read_csv(StringIO(csv))
+    stats = TournamentStats.from_chunks([df])
+    assert stats.names == ['Bot1', 'Bot2', 'Bot3']
+    assert stats.wins.tolist() == [2, 3, 0]
+    assert stats.matches.tolist() == [4, 4, 3]
+    assert stats.turns.tolist() == [120, 110, 120]
+    assert stats.cpu.tolist() == [3.0, 2.0, 2.5]
+    assert stats.elo('least_squares') == approx(estimate_elo(df[stats.names]).to_numpy())
+    assert stats.elo('bradley_terry') == approx(estimate_bradley_terry(df[stats.names], prior=1.0).to_numpy())
+    with raises(ValueError):
+        stats.elo('unknown')
+
+    chunked = TournamentStats.from_chunks(read_csv(StringIO(csv), chunksize=2))
+    for attribute in ['wins', 'matches', 'turns', 'cpu', 'pair_wins', 'pair_draws', 'adjacent_wins']:
+        assert np.array_equal(getattr(stats, attribute), getattr(chunked, attribute))
+
+
+def test_tournament_stats_memory():
+    csv = """Bot1,Bot2,turns,seed,cpu_Bot1,cpu_Bot2,mem_Bot1,mem_Bot2,peak_Bot1,peak_Bot2
+1,2,10,0,0.5,0.25,1000,0,500,100
+2,1,20,0,0.5,0.25,3000,-100,700,50
+    """
+    stats = TournamentStats.from_chunks(read_csv(StringIO(csv), chunksize=1))
+    assert stats.names == ['Bot1', 'Bot2']
+    assert stats.memory.tolist() == [4000, -100]
+    assert stats.memory_peak.tolist() == [700, 100]
+    assert stats.to_frame()['Peak'].tolist() == [700, 100]
+
+
+def test_bot_names_phases():
+    columns = ['Bot1', 'Bot2', 'turns', 'seed', 'cpu_Bot1', 'cpu_Bot2', 'phase_copy', 'phase_bots']
+    assert bot_names(columns) == ['Bot1', 'Bot2']
@@ -2,11 +2,16 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 
+import random
+import tracemalloc
+
 import numpy as np
+import pytest
 
 from .bot import Bot
 from .bots.random import Random
-from .game import Game, RoundType, serialize, deserialize
+from .constants import Move
+from .game import PHASES, Game, RoundType, serialize, deserialize, deserialize_batch, direction_to_str
 from .snake import Snake
 
 
@@ -189,3 +194,108 @@ def test_game_deserialize_in_place():
     data = '16x16c8,2/3,12/15,13t0s4,4p/2,0p'
     grid_size, candies, turn, snakes = deserialize(data)
     assert data == serialize(grid_size, candies, turn, snakes)
+
+
+def test_game_deserialize_batch():
+    data = ['16x16c13,1/14,2/0,10t0s0,9rruuurrrdld/6,14drddddrrdlldd', '16x16c8,2/3,12/15,13t0s4,4p/2,0p',
+            '4x4ct1s0,0p/3,3p/2,2ll']
+    states = deserialize_batch(data)
+    assert [serialize(*state) for state in states] == data
+    for state, expected in zip(states, data):
+        grid_size, candies, turn, snakes = deserialize(expected)
+        assert state[:3] == (grid_size, candies, turn)
+        assert [s.id for s in state[3]] == [s.id for s in snakes]
+        assert all(np.array_equal(a.positions, b.positions) for a, b in zip(state[3], snakes))
+
+    with pytest.raises(ValueError):
+        deserialize('4x4ct0s0,0px')
+
+
+def test_game_serialize_directions():
+    rng = np.random.default_rng(0)
+    snake = Snake(id=0, positions=np.cumsum(rng.integers(-1, 2, size=(100, 2)), axis=0) + 50)
+    expected = f'{snake[0][0]},{snake[0][1]}' + ''.join(direction_to_str(snake[i] - snake[i - 1])
+                                                        for i in range(1, len(snake)))
+    assert serialize((100, 100), [], 0, [snake]) == f'100x100ct0s{expected}'
+
+
+class Leaky(Random):
+    """
+    Random bot that keeps 100 kB for every move, and allocates 1 MB during a move
+    """
+
+    def __init__(self, id, grid_size):
+        super().__init__(id, grid_size)
+        self.leak = []
+
+    def determine_next_move(self, snake, other_snakes, candies):
+        self.leak.append(bytearray(100_000))
+        temporary = bytearray(1_000_000)
+        del temporary
+        return super().determine_next_move(snake, other_snakes, candies)
+
+
+def test_game_track_memory():
+    game = Game(agents={0: Random, 1: Leaky}, grid_size=(8, 8), track_memory=True)
+    for _ in range(10):
+        list(game.update())
+    tracemalloc.stop()
+    moves = len(game.agents[1].leak)
+    assert moves >= 4
+    assert 100_000 * moves <= game.memory[1] < 100_000 * moves + 50_000
+    assert game.memory[0] < 50_000
+    assert 1_000_000 <= game.memory_peak[1] < 1_200_000
+    assert game.memory_peak[0] < 50_000
+
+
+class Circle(Bot):
+    """
+    Bot that keeps nothing, and goes around in a square of 2 by 2 cells with even coordinates in its lower left corner
+    """
+
+    @property
+    def name(self):
+        return 'Circle'
+
+    @property
+    def contributor(self):
+        return 'Nobleo'
+
+    def determine_next_move(self, snake, other_snakes, candies):
+        # indexing single elements, a view like snake[0] would leave a few bytes in the caches of numpy
+        x, y = snake.positions[0, 0] % 2, snake.positions[0, 1] % 2
+        return [[Move.UP, Move.RIGHT], [Move.LEFT, Move.DOWN]][x][y]
+
+
+def test_game_track_memory_keeps_nothing():
+    random.seed(1)
+    snakes = [Snake(0, np.array([[2, 3], [2, 2]])), Snake(1, np.array([[6, 3], [6, 2]]))]
+    game = Game(agents={0: Circle, 1: Circle}, grid_size=(32, 32), snakes=snakes, max_turns=500, track_memory=True)
+    constructed = dict(game.memory)
+    while not game.finished():
+        list(game.update())
+    tracemalloc.stop()
+    assert game.turns == 500
+    for i in game.agents:
+        # less than a byte per move
+        assert abs(game.memory[i] - constructed[i]) < game.turns
+        assert game.memory_peak[i] < 5_000
+
+
+def test_game_time_phases():
+    def play(time_phases):
+        random.seed(1)
+        game = Game(agents={0: Random, 1: Random}, grid_size=(8, 8), time_phases=time_phases)
+        events = []
+        while not game.finished():
+            events += [type(event).__name__ for event in game.update()]
+        return game, events
+
+    game, events = play(time_phases=True)
+    assert list(game.phases) == list(PHASES)
+    assert all(time > 0 for time in game.phases.values())
+    # timing does not change the game
+    untimed, untimed_events = play(time_phases=False)
+    assert untimed.phases is None
+    assert events == untimed_events
+    assert untimed.scores == game.scores
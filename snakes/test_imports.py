@@ -0,0 +1,41 @@
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+HEAVY_MODULES = ['pandas', 'scipy', 'yaml', 'matplotlib']
+
+BENCHMARK = """
+import json, sys, time
+start = time.perf_counter()
+import snakes.elo, snakes.game, snakes.replay, snakes.utils
+elapsed = time.perf_counter() - start
+print(json.dumps({'elapsed': elapsed, 'loaded': [m for m in %r if m in sys.modules]}))
+"""
+
+
+def benchmark_import():
+    """
+    Import the engine modules in a fresh interpreter, like a worker process would do
+
+    :return: The import time in seconds and the heavy modules that got loaded
+    """
+    output = subprocess.check_output([sys.executable, '-c', BENCHMARK % HEAVY_MODULES],
+                                     cwd=Path(__file__).parent.parent)
+    result = json.loads(output)
+    return result['elapsed'], result['loaded']
+
+
+def test_import_is_lazy():
+    elapsed, loaded = benchmark_import()
+    print(f'importing the engine took {elapsed * 1000:.1f} ms')
+    assert loaded == []
+
+
+if __name__ == '__main__':
+    elapsed, loaded = benchmark_import()
+    print(f'importing the engine took {elapsed * 1000:.1f} ms, heavy modules loaded: {loaded}')
@@ -0,0 +1,53 @@
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import pickle
+import pstats
+import random
+
+import numpy as np
+
+from .game import Game
+from .profiling import Profiler, latency_percentiles, write_profiles
+from .test_replay import FirstFreeMove
+
+
+def play_profiled_game(seed):
+    random.seed(seed)
+    profiler = Profiler()
+    game = Game(agents={i: FirstFreeMove for i in range(2)}, grid_size=(8, 8), profiler=profiler)
+    while not game.finished():
+        list(game.update())
+    return profiler, game
+
+
+def test_profiler(tmp_path):
+    profiler, game = play_profiled_game(0)
+    results = profiler.results()
+    assert list(results) == ['FirstFreeMove']
+    stats, latencies = results['FirstFreeMove']
+    # both snakes moved every turn, unless the first one died
+    assert game.turns * 2 - 1 <= len(latencies) <= game.turns * 2
+    calls = [stat[1] for function, stat in stats.items() if function[2] == 'determine_next_move']
+    assert calls == [len(latencies)]
+
+    # merge the results of another game, like they come from a worker process
+    other, _ = play_profiled_game(1)
+    merged = Profiler()
+    merged.merge(pickle.loads(pickle.dumps(results)))
+    merged.merge(pickle.loads(pickle.dumps(other.results())))
+    stats, latencies = merged.results()['FirstFreeMove']
+    assert len(latencies) == len(results['FirstFreeMove'][1]) + len(other.results()['FirstFreeMove'][1])
+    assert [stat[1] for function, stat in stats.items() if function[2] == 'determine_next_move'] == [len(latencies)]
+
+    paths = write_profiles(merged, tmp_path, 'test')
+    assert pstats.Stats(str(paths['FirstFreeMove'])).total_calls == sum(stat[1] for stat in stats.values())
+    assert (tmp_path / 'test_latency.csv').read_text().startswith('name,moves,p50_ms,p95_ms,p99_ms,max_ms\n')
+
+
+def test_latency_percentiles():
+    percentiles = latency_percentiles(np.arange(1, 101) * 1e6)
+    assert list(percentiles) == ['p50', 'p95', 'p99', 'max']
+    assert percentiles['max'] == 100
+    assert 50 <= percentiles['p50'] <= 51 and 95 <= percentiles['p95'] <= 96
@@ -0,0 +1,196 @@
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+import random
+import subprocess
+import sys
+from pathlib import Path
+
+import yaml
+
+from .bot import Bot
+from .constants import MOVE_VALUE_TO_DIRECTION, MOVES, Move
+from .game import Game, describe_event, serialize, serialize_snake
+from .replay import ReplayArchive, ReplayReader, ReplayWriter, add_keyframes, index_path, position_arguments, \
+    position_hash, read_replays, recorded_positions, verify_replay
+
+DOCS = [
+    {'initial': '4x4ct0s0,0p/3,3p', 'moves': 'c1,1 0u 1d', 'agents': ['A', 'B'], 'rank': [1, 2]},
+    {'initial': '4x4ct0s0,0p/3,3p', 'moves': 'c1,1 0r 1l', 'agents': ['B', 'C'], 'rank': [1, 1]},
+    {'initial': '4x4ct0s0,0p/3,3p', 'moves': 'c2,2 0u 1l', 'agents': ['C', 'A'], 'rank': [1, 2]},
+]
+
+
+def test_archive(tmp_path):
+    path = tmp_path / 'replay.yml'
+    with ReplayWriter(path) as writer:
+        for seed, doc in enumerate(DOCS):
+            writer.write(doc, seed=seed)
+
+    archive = ReplayArchive(path)
+    assert len(archive) == 3
+    assert archive[2] == DOCS[2]
+    assert archive[0] == DOCS[0]
+    assert archive.index[1]['seed'] == 1
+
+    # the replay file itself stays a valid multi-document YAML file
+    with open(path) as f:
+        assert list(yaml.safe_load_all(f)) == DOCS
+
+    assert archive.select(bot='A') == [0, 2]
+    assert archive.select(bot='A', opponent='C') == [2]
+    assert archive.select(opponent='C') == [1, 2]
+    assert archive.select(bot='A', outcome='loss') == [2]
+    assert archive.select(bot='B', outcome='draw') == [1]
+
+    # without an index, the file is scanned
+    os.remove(index_path(path))
+    archive = ReplayArchive(path)
+    assert [archive[i] for i in range(len(archive))] == DOCS
+    assert archive.select(bot='C', outcome='win') == [2]
+
+
+def test_replay_script_game_out_of_range(tmp_path):
+    path = tmp_path / 'replay.yml'
+    with ReplayWriter(path) as writer:
+        for doc in DOCS:
+            writer.write(doc)
+
+    result = subprocess.run([sys.executable, 'replay.py', str(path), '--game', '1', '99', '--no-state'],
+                            cwd=Path(__file__).parent.parent, capture_output=True, text=True)
+    assert result.returncode == 2
+    assert '--game 99 out of range, the match has 3 replays' in result.stderr
+    assert 'Traceback' not in result.stderr
+
+
+def test_binary_archive(tmp_path):
+    path = tmp_path / 'replay.bin'
+    with ReplayWriter(path, format='binary') as writer:
+        for doc in DOCS:
+            writer.write(doc)
+
+    archive = ReplayArchive(path)
+    assert archive.format == 'binary'
+    assert archive[1] == DOCS[1]
+    assert list(read_replays(path)) == DOCS
+
+    os.remove(index_path(path))
+    archive = ReplayArchive(path)
+    assert [archive[i] for i in range(len(archive))] == DOCS
+
+
+def test_jsonl_archive(tmp_path):
+    path = tmp_path / 'replay.jsonl'
+    with ReplayWriter(path, format='jsonl') as writer:
+        for doc in DOCS:
+            writer.write(doc)
+
+    archive = ReplayArchive(path)
+    assert archive.format == 'jsonl'
+    assert archive[1] == DOCS[1]
+    assert list(read_replays(path)) == DOCS
+
+    # also without an index, and without a newline at the end
+    os.remove(index_path(path))
+    with open(path, 'rb+') as f:
+        f.truncate(os.path.getsize(path) - 1)
+    archive = ReplayArchive(path)
+    assert [archive[i] for i in range(len(archive))] == DOCS
+
+
+class FirstFreeMove(Bot):
+    """
+    Deterministic bot, that moves to the first free position
+    """
+
+    @property
+    def name(self):
+        return 'FirstFreeMove'
+
+    @property
+    def contributor(self):
+        return 'Nobleo'
+
+    def determine_next_move(self, snake, other_snakes, candies):
+        for move in MOVES:
+            position = snake[0] + MOVE_VALUE_TO_DIRECTION[move]
+            if (0 <= position[0] < self.grid_size[0] and 0 <= position[1] < self.grid_size[1]
+                    and not any(s.collides(position) for s in [snake] + other_snakes)):
+                return move
+        return Move.UP
+
+
+def play_game(seed, players=3, grid_size=(8, 8)):
+    random.seed(seed)
+    game = Game(agents={i: FirstFreeMove for i in range(players)}, grid_size=grid_size)
+    events = []
+    while not game.finished():
+        events += [describe_event(event, game.turns) for event in game.update()]
+    doc = game.save_replay()
+    doc['turns'] = game.turns
+    doc['events'] = events
+    return doc
+
+
+def state_summary(state):
+    return (serialize(state.grid_size, state.candies, state.turn, state.snakes), state.turns,
+            sorted(state.scores.items()), [serialize_snake(snake) for snake in state.dead_snakes])
+
+
+def test_seek(tmp_path):
+    doc = play_game(seed=3)
+    reader = ReplayReader(doc)
+    list(reader.states())
+    final_turns = reader.state.turns
+    assert reader.state.dead_snakes, 'at least one snake should die'
+
+    # seeking forward without keyframes re-simulates the moves in between
+    reader = ReplayReader(doc)
+    expected = [state_summary(reader.seek(turn)) for turn in range(final_turns + 1)]
+
+    doc = add_keyframes(doc, 10)
+    assert len(doc['keyframes']) == final_turns // 10
+    reader = ReplayReader(doc)
+    turns = list(range(final_turns + 1))
+    random.Random(0).shuffle(turns)
+    for turn in turns:
+        assert state_summary(reader.seek(turn)) == expected[turn], turn
+
+    # keyframes are stored with the replay
+    for format in ['yaml', 'jsonl', 'binary']:
+        with ReplayWriter(tmp_path / format, format=format) as writer:
+            writer.write(doc)
+        assert ReplayArchive(tmp_path / format)[0] == doc
+
+
+def test_verify_replay():
+    doc = play_game(seed=5)
+    assert any('death' in event for event in doc['events'])
+    assert verify_replay(doc) == []
+
+    rank = [r + 1 for r in doc['rank']]
+    assert verify_replay(dict(doc, rank=rank)) == [f'rank {rank} became {doc["rank"]}']
+    assert verify_replay(dict(doc, turns=doc['turns'] + 1)) == [f'turns {doc["turns"] + 1} became {doc["turns"]}']
+
+    # a different move changes how the game continues
+    moves = doc['moves'].split()
+    i = next(i for i, move in enumerate(moves) if not move.startswith('c'))
+    moves[i] = moves[i][:-1] + ('l' if moves[i][-1] != 'l' else 'r')
+    assert verify_replay(dict(doc, moves=' '.join(moves)))
+
+
+def test_recorded_positions():
+    doc = play_game(seed=7)
+    positions = list(recorded_positions(doc))
+    assert len(positions) == len(ReplayReader(doc).history.history) - doc['moves'].count('c')
+
+    # the bot that played the game agrees with every recorded move
+    for position, move in positions:
+        grid_size, _, id, _ = position
+        assert FirstFreeMove(id=id, grid_size=grid_size).determine_next_move(**position_arguments(position)) == move
+
+    assert position_hash(positions[0][0]) == position_hash(next(recorded_positions(doc))[0])
+    # these bots move in circles until the turn limit, so most positions repeat
+    assert len({position_hash(position) for position, _ in positions}) < len(positions) / 2
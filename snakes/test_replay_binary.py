@@ -0,0 +1,31 @@
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+from io import BytesIO
+
+from .replay_binary import decode, dumps, encode, read_replays
+
+
+def test_round_trip():
+    doc = {
+        'initial': '16x16c13,1/14,2t0s0,9rruuurrrdld/6,14drddddrrdlldd/3,3p',
+        # three snakes, the second one dies and later the order is not a cycle anymore
+        'moves': 'c1,2 c200,3 0u 1d 2l 0r 1r c4,5 2u 0d 1l 2d 0u 2r 0l 2l 2u 0d 1u 1r',
+        'agents': ['A', 'B', 'C'],
+        'rank': [1, 3, 2],
+    }
+    assert decode(encode(doc)) == doc
+
+
+def test_no_moves():
+    doc = {'initial': '4x4ct0s0,0p/3,3p', 'moves': '', 'agents': ['A', 'B'], 'rank': None}
+    assert decode(encode(doc)) == doc
+
+
+def test_stream():
+    docs = [
+        {'initial': '4x4ct0s0,0p/3,3p', 'moves': 'c1,1 0u 1d', 'agents': ['A', 'B'], 'rank': [1, 2]},
+        {'initial': '4x4ct0s0,0p/3,3p', 'moves': '0r 1l c2,2', 'agents': ['B', 'C'], 'rank': [1, 1]},
+    ]
+    assert list(read_replays(BytesIO(dumps(docs)))) == docs
@@ -0,0 +1,68 @@
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import io
+import os
+import shutil
+
+import numpy as np
+
+from .constants import RIGHT
+from .game import State
+from .snake import Snake
+from .utils import TERMINAL_SIZE_INTERVAL, Printer
+
+
+def make_state():
+    snake = Snake(0, np.array([[1, 0], [0, 0]]))
+    return State([snake], grid_size=(3, 2), candies=[np.array([2, 1])])
+
+
+def test_printer_full():
+    output = io.StringIO()
+    Printer(output, differential=False, state=False).print(make_state())
+    assert output.getvalue().split('\n') == [
+        ' ▁▁▁▁▁▁▁ ',
+        '▕     * ▏',
+        '▕ ⓪ ⓪   ▏',
+        ' ▔▔▔▔▔▔▔ ',
+        '',
+    ]
+
+
+def test_printer_differential():
+    output = io.StringIO()
+    printer = Printer(output, differential=True, state=False)
+    state = make_state()
+    printer.print(state)
+    assert output.getvalue().startswith('\033[2J\033[H ▁▁▁▁▁▁▁ \n▕     * ▏\n')
+
+    # the tail at (0, 0) is cleared and the head moves to (2, 0), both on the bottom row of the grid at screen row 3
+    output.seek(0)
+    output.truncate()
+    state.snakes[0].move(RIGHT)
+    printer.print(state)
+    assert output.getvalue() == '\0337\033[3;3H \033[3;7H⓪\0338'
+
+    # the scroll region is reset
+    output.seek(0)
+    output.truncate()
+    printer.close()
+    assert output.getvalue().startswith('\033[r')
+
+
+def test_printer_terminal_size(monkeypatch):
+    sizes = []
+
+    def get_terminal_size():
+        sizes.append((80, 24))
+        return os.terminal_size(sizes[-1])
+    monkeypatch.setattr(shutil, 'get_terminal_size', get_terminal_size)
+
+    printer = Printer(io.StringIO(), differential=True, state=False)
+    state = make_state()
+    for _ in range(2 * TERMINAL_SIZE_INTERVAL):
+        printer.print(state)
+    printer.close()
+    assert len(sizes) == 2
@@ -0,0 +1,27 @@
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+
+from .test_replay import play_game
+from .video import frame_path, frame_turns, render_frames
+
+
+def test_render_frames(tmp_path):
+    doc = play_game(seed=2, grid_size=(6, 6))
+    turns = frame_turns(doc)
+    assert turns == sorted(turns)
+
+    # a single chunk, rendered from the start without seeking
+    frames = render_frames(doc, tmp_path / 'single', size=60, format='tga', turns_per_chunk=turns[-1] + 1, jobs=1)
+    assert frames == len(turns)
+    assert sorted(os.listdir(tmp_path / 'single')) == [os.path.basename(frame_path('', i, 'tga')) for i in
+                                                       range(frames)]
+
+    # chunks rendered by several processes give the same images
+    assert render_frames(doc, tmp_path / 'chunks', size=60, format='tga', turns_per_chunk=7, jobs=2) == frames
+    for i in range(frames):
+        with open(frame_path(tmp_path / 'single', i, 'tga'), 'rb') as a, \
+                open(frame_path(tmp_path / 'chunks', i, 'tga'), 'rb') as b:
+            assert a.read() == b.read(), i
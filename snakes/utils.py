@@ -1,6 +1,9 @@
 # Copyright 2023 Nobleo Technology B.V.
 #
 # SPDX-License-Identifier: Apache-2.0
+import shutil
+import sys
+
 import numpy as np
 
 from .game import serialize
@@ -56,23 +59,99 @@ def number_to_circled(number: int) -> str:
     return numbers[number % len(numbers)]
 
 
+# amount of frames after which `Printer` looks up the size of the terminal again, to notice a resize
+TERMINAL_SIZE_INTERVAL = 20
+
+
 class Printer:
-    def print(self, game):
-        grid = np.empty(game.grid_size, dtype=str)
-        grid.fill(' ')
+    """
+    Print the grid of a game to a terminal
+
+    Every frame is written at once. In an interactive terminal the grid stays at the top of the screen, and only the
+    cells that changed since the previous frame are rewritten, with cursor addressing. Everything else that is printed,
+    like the events, scrolls underneath it. Elsewhere, or when the terminal is too small, every frame is printed in
+    full.
+    """
+
+    def __init__(self, file=None, differential=None, state=True):
+        """
+        :param file: Stream to print to, by default `sys.stdout`
+        :param differential: Only rewrite the changed cells, by default when the stream is an interactive terminal
+        :param state: Print the serialized game state below every frame
+        """
+        self.file = sys.stdout if file is None else file
+        self.differential = getattr(self.file, 'isatty', lambda: False)() if differential is None else differential
+        self.state = state
+        self.previous = None  # cell codes of the frame on the screen, in differential mode
+        self.columns = None
+        self.rows = None
+        self.frames = 0  # amount of frames since the size of the terminal was looked up
+        self.characters = np.array([' ', '*'] + numbers)
+
+    def cells(self, game):
+        """
+        :return: Array of the grid size with 0 for an empty cell, 1 for a candy and 2 + id for a snake
+        """
+        cells = np.zeros(game.grid_size, dtype=np.int32)
         for candy in game.candies:
-            grid[candy[0], candy[1]] = '*'
+            cells[candy[0], candy[1]] = 1
         for snake in game.snakes:
-            if snake is None:
-                continue
-            for pos in snake:
-                grid[pos[0], pos[1]] = number_to_circled(snake.id)
-
-        print(f' {"▁" * 2 * game.grid_size[0]}▁ ')
-        for j in reversed(range(grid.shape[1])):
-            print('▕', end='')
-            for i in range(grid.shape[0]):
-                print(f' {grid[i, j]}', end='')
-            print(' ▏')
-        print(f' {"▔" * 2 * game.grid_size[0]}▔ ')
-        print('Game state:', serialize(game.grid_size, game.candies, game.turn, game.snakes))
+            if snake is not None:
+                cells[snake.positions[:, 0], snake.positions[:, 1]] = 2 + snake.id % len(numbers)
+        return cells
+
+    def print(self, game):
+        cells = self.cells(game)
+        state = f'Game state: {serialize(game.grid_size, game.candies, game.turn, game.snakes)}' if self.state else None
+        if self.differential:
+            self.update_terminal_size()
+
+        if self.differential and self.previous is not None and self.previous.shape == cells.shape:
+            # save the cursor, rewrite the changed cells (the grid starts at row 2, column 1 of the screen) and restore
+            parts = ['\0337']
+            for i, j in zip(*np.nonzero(cells != self.previous)):
+                parts.append(f'\033[{cells.shape[1] - j + 1};{2 * i + 3}H{self.characters[cells[i, j]]}')
+            if state is not None:
+                parts.append(f'\033[{cells.shape[1] + 3};1H{state[:self.columns]}\033[K')
+            parts.append('\0338')
+            self.write(''.join(parts))
+            self.previous = cells
+            return
+
+        width = cells.shape[0]
+        rows = self.characters[cells.T[::-1]]
+        lines = [f' {"▁" * 2 * width}▁ ']
+        lines += ['▕ ' + ' '.join(row) + ' ▏' for row in rows]
+        lines += [f' {"▔" * 2 * width}▔ ']
+        if state is not None:
+            lines.append(state)
+
+        if self.differential and len(lines) + 1 < self.rows and len(lines[0]) <= self.columns:
+            if state is not None:
+                lines[-1] = state[:self.columns]  # a wrapped line would end up in the scrolling part
+            # clear the screen, draw the grid at the top and let the rest of the screen scroll underneath it
+            self.write('\033[2J\033[H' + '\n'.join(lines) + f'\033[{len(lines) + 1};{self.rows}r\033[{self.rows};1H')
+            self.previous = cells
+        else:
+            self.write('\n'.join(lines) + '\n')
+
+    def update_terminal_size(self):
+        """
+        Look up the size of the terminal, at most once every `TERMINAL_SIZE_INTERVAL` frames
+        """
+        if self.columns is None or self.frames >= TERMINAL_SIZE_INTERVAL:
+            self.columns, self.rows = shutil.get_terminal_size()
+            self.frames = 0
+        self.frames += 1
+
+    def close(self):
+        """
+        Give the whole screen back to the terminal
+        """
+        if self.previous is not None:
+            self.write('\033[r' + f'\033[{self.rows};1H\n')
+            self.previous = None
+
+    def write(self, text):
+        self.file.write(text)
+        self.file.flush()
@@ -0,0 +1,124 @@
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+"""
+Render replays to images without a display
+
+There is one frame per `Game.update`, like in the GUI: the state before every move, and the final state. The frames
+are divided in chunks of turns, which are rendered in parallel. Each worker seeks to the start of its chunk with the
+keyframes of the replay, see `snakes.replay.add_keyframes`.
+"""
+
+import os
+from multiprocessing import Pool
+from tempfile import TemporaryDirectory
+
+CHERRY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sprites', 'cherry.png')
+
+
+def frame_turns(doc):
+    """
+    :return: For each frame the value of `State.turns`
+    """
+    from .replay import ReplayReader
+
+    reader = ReplayReader(doc)
+    turns = [state.turns for state, _ in reader.positions()]
+    return turns + [reader.state.turns]
+
+
+# image formats that pygame can save, TGA is much faster to write than PNG
+IMAGE_FORMATS = ('png', 'tga', 'bmp', 'jpg')
+
+
+def frame_path(directory, index, format='png'):
+    return os.path.join(directory, f'frame_{index:05d}.{format}')
+
+
+_worker = None
+
+
+def _init_worker(doc, size, directory, format):
+    global _worker
+    # render without a window
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+
+    from .render import ArenaRenderer
+    from .replay import ReplayReader
+
+    surface = pygame.Surface((size, size))
+    _worker = ReplayReader(doc), ArenaRenderer(surface, size, pygame.image.load(CHERRY)), surface, directory, format
+
+
+def _render_chunk(args):
+    """
+    Render the frames from the start of turn `start` up to the start of turn `end`
+    """
+    index, start, end, final = args
+    import pygame
+
+    reader, renderer, surface, directory, format = _worker
+    renderer.cells = None
+    reader.seek(start)
+    for state, _ in reader.positions():
+        if state.turns >= end:
+            break
+        renderer.draw(state)
+        pygame.image.save(surface, frame_path(directory, index, format))
+        index += 1
+    else:
+        if final:
+            renderer.draw(reader.state)
+            pygame.image.save(surface, frame_path(directory, index, format))
+            index += 1
+    return index
+
+
+def render_frames(doc, directory, size=512, format='png', turns_per_chunk=50, jobs=None):
+    """
+    Render all frames of a replay to images in a directory
+
+    :param size: Width and height of the images in pixels
+    :param format: One of `IMAGE_FORMATS`
+    :param turns_per_chunk: Amount of turns rendered by a worker at once
+    :param jobs: Amount of worker processes, None for one per CPU
+    :return: The amount of frames
+    """
+    from .replay import add_keyframes
+
+    if not doc.get('keyframes'):
+        doc = add_keyframes(doc, turns_per_chunk)
+    turns = frame_turns(doc)
+    tasks = []
+    for start in range(0, turns[-1] + 1, turns_per_chunk):
+        index = next(i for i, t in enumerate(turns) if t >= start)
+        tasks.append((index, start, start + turns_per_chunk, start + turns_per_chunk > turns[-1]))
+
+    assert format in IMAGE_FORMATS, format
+    os.makedirs(directory, exist_ok=True)
+    if jobs == 1:
+        _init_worker(doc, size, directory, format)
+        list(map(_render_chunk, tasks))
+    else:
+        with Pool(jobs, initializer=_init_worker, initargs=(doc, size, directory, format)) as pool:
+            pool.map(_render_chunk, tasks)
+    return len(turns)
+
+
+def render_gif(doc, path, size=512, fps=20, turns_per_chunk=50, jobs=None):
+    """
+    Render a replay to an animated GIF, via images in a temporary directory
+
+    :param fps: Frames per second
+    :return: The amount of frames
+    """
+    from PIL import Image
+
+    with TemporaryDirectory() as directory:
+        frames = render_frames(doc, directory, size, 'tga', turns_per_chunk, jobs)
+        images = (Image.open(frame_path(directory, i, 'tga')) for i in range(frames))
+        first = next(images)
+        first.save(path, save_all=True, append_images=images, duration=1000 / fps, loop=0)
+    return frames
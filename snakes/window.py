@@ -5,44 +5,23 @@
 import math
 import time
 from abc import abstractmethod
+from copy import deepcopy
 from enum import Enum, auto
+from queue import Empty, Full, Queue
 from random import random, choice, randrange
+from threading import Condition, Thread
 
 import numpy as np
 import pygame
 
 from .bots import bots
 from .game import Game
+from .profiling import Profiler
+from .render import BLACK, COLOURS, WHITE, ArenaRenderer, system_font
 from .utils import levenshtein_ratio
 
-BLACK = (0, 0, 0)
-GRAY = (64, 64, 64)
-WHITE = (255, 255, 255)
 RED = (255, 0, 0)
 
-COLOURS = [
-    (230, 25, 75),
-    (60, 180, 75),
-    (255, 225, 25),
-    (0, 130, 200),
-    (245, 130, 48),
-    (145, 30, 180),
-    (70, 240, 240),
-    (240, 50, 230),
-    (210, 245, 60),
-    (250, 190, 212),
-    (0, 128, 128),
-    (220, 190, 255),
-    (170, 110, 40),
-    (255, 250, 200),
-    (128, 0, 0),
-    (170, 255, 195),
-    (128, 128, 0),
-    (255, 215, 180),
-    (0, 0, 128),
-    (128, 128, 128),
-]
-
 BUTTON = (51, 51, 51)
 POPUP = (36, 36, 36)
 
@@ -59,8 +38,110 @@ class GameSpeed(Enum):
     FASTER = auto()
 
 
+# amount of `Game.update`s to show per second, each is the move of one snake
+UPDATES_PER_SECOND = {
+    GameSpeed.SLOWER: 10,
+    GameSpeed.FASTER: 100,
+}
+
+
+class Frame:
+    """
+    Copy of everything the window shows of a game, taken after an update
+    """
+
+    def __init__(self, game):
+        self.grid_size = game.grid_size
+        self.snakes = deepcopy(game.snakes)
+        self.dead_snakes = deepcopy(game.dead_snakes)
+        self.candies = deepcopy(game.candies)
+        self.possible_scores = game.possible_scores()
+        self.cpu = dict(game.cpu)
+        self.turns = game.turns
+        self.finished = game.finished()
+
+
+class GameRunner:
+    """
+    Play a game in a background thread, so a slow bot does not block the window
+
+    After every update a `Frame` is put in a bounded queue, which the window consumes at its own pace. When the queue is
+    full, the game waits for the window.
+    """
+
+    def __init__(self, game, queue_size=64):
+        self.game = game
+        self.frames = Queue(maxsize=queue_size)
+        self.first_frame = Frame(game)
+        self.running = False
+        self.steps = 0  # amount of updates to play while not running
+        self.stopped = False
+        self.error = None
+        self.condition = Condition()
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def set_running(self, running):
+        with self.condition:
+            self.running = running
+            self.condition.notify()
+
+    def step(self):
+        """
+        Play a single update while not running
+        """
+        with self.condition:
+            self.steps += 1
+            self.condition.notify()
+
+    def stop(self):
+        """
+        Stop playing. Does not wait for a bot that is thinking, the thread ends as soon as it returns.
+        """
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+
+    def get(self):
+        """
+        :return: The next frame, or None if the game did not get that far yet
+        """
+        if self.error is not None:
+            raise self.error
+        try:
+            return self.frames.get_nowait()
+        except Empty:
+            return None
+
+    def _run(self):
+        try:
+            while not self.game.finished():
+                with self.condition:
+                    self.condition.wait_for(lambda: self.running or self.steps > 0 or self.stopped)
+                    if self.stopped:
+                        return
+                    if not self.running:
+                        self.steps -= 1
+                list(self.game.update())
+                frame = Frame(self.game)
+                while not self.stopped:
+                    try:
+                        self.frames.put(frame, timeout=0.1)
+                        break
+                    except Full:
+                        pass
+        except Exception as e:
+            self.error = e
+
+
 class Window:
-    def __init__(self, window, width, height, snake1=None, snake2=None):
+    def __init__(self, window, width, height, snake1=None, snake2=None, profiler=None):
+        """
+        :param profiler: `snakes.profiling.Profiler` for the moves of the bots in every game, None to not profile. The
+                         profiles of a game are merged into it when the game is stopped, see `merge_profiles`
+        """
+        self.profiler = profiler
+        self.stopped_runners = []  # runners of which the profiles are not merged yet
         self.game_state = GameState.RUNNING
         self.window = window
         self.width = width
@@ -90,7 +171,12 @@ class Window:
 
         # Create the first game with the first two bots
         # The ID's will always represent the player number
-        self.game = Game(agents=agents)
+        self.game = Game(agents=agents, profiler=self.game_profiler())
+        self.runner = GameRunner(self.game)
+        self.runner.set_running(self.game_state == GameState.RUNNING)
+        self.frame = self.runner.first_frame
+        self.updates_due = 0.0  # amount of updates to show, accumulated over the frames
+        self.steps = 0  # amount of updates to show while not running
 
         # Some GUI stuff
         pygame.font.init()
@@ -101,7 +187,13 @@ class Window:
 
         # The scoreboard is where all the scores will be printed
         self.scoreboard = pygame.Surface(self.window.get_size())
-        self.font = pygame.font.SysFont(None, 24)
+        self.font = system_font(24)
+
+        # Cached layers, see `draw_arena` and `draw_information`
+        self.arena = ArenaRenderer(self.window, self.height, self.cherry_image)
+        self.information_layer = pygame.Surface(self.window.get_size())
+        self.information_key = None  # what the information layer shows
+        self.hovered = None  # button with a hover outline
 
     class Popup:
         def __init__(self, **kwargs):
@@ -146,7 +238,7 @@ class Window:
 
             # Close the popup
             self.root.popup = None
-            self.root.game_state = GameState.RUNNING
+            self.root.set_state(GameState.RUNNING)
 
         def draw_concrete(self):
             border = self.parent.border
@@ -192,21 +284,23 @@ class Window:
             self.align = kwargs.get("align", "center")
 
             self.window = self.root.window
-            self.font = pygame.font.SysFont(None, self.height)
+            self.font = system_font(self.height)
 
-            pygame.draw.rect(self.window, self.background_colour, (*self.position, self.width, self.height))
+            # the button is drawn on a cached layer, but hovers are drawn directly on the window
+            surface = kwargs.get("surface", self.window)
+            pygame.draw.rect(surface, self.background_colour, (*self.position, self.width, self.height))
 
             if self.text:
                 text_object = self.font.render(self.text, True, WHITE)
                 text_size = self.font.size(self.text)
 
                 if self.align == "center":
-                    self.window.blit(text_object, (
+                    surface.blit(text_object, (
                         self.position[0] + self.width / 2 - text_size[0] / 2,
                         self.position[1] + self.height / 2 - text_size[1] / 2
                     ))
                 elif self.align == "left":
-                    self.window.blit(text_object, (
+                    surface.blit(text_object, (
                         self.position[0] + self.root.border,
                         self.position[1] + self.height / 2 - text_size[1] / 2
                     ))
@@ -223,7 +317,14 @@ class Window:
                 position[1] >= self.position[1] and position[1] <= self.position[1] + self.height
 
     def set_state(self, state):
+        if state == GameState.STEP:
+            self.steps += 1
+            self.runner.step()
+            state = GameState.IDLE
+        if self.game_state == GameState.FINISHED:
+            return
         self.game_state = state
+        self.runner.set_running(state == GameState.RUNNING)
 
     def set_speed(self, speed=None):
         if speed is not None:
@@ -263,10 +364,17 @@ class Window:
         # Setup new game with this snake
         what = "sprites/cherry.png" if random() > 0.05 else ".vscode/configuration.json"
         self.cherry_image = pygame.image.load(what)
-        self.game = Game(agents, grid_size=(32, 32) if self.multiplayer else (16, 16))
+        self.arena.set_sprite(self.cherry_image)
+        self.stop_runner()
+        self.game = Game(agents, grid_size=(32, 32) if self.multiplayer else (16, 16), profiler=self.game_profiler())
+        self.runner = GameRunner(self.game)
+        self.frame = self.runner.first_frame
+        self.updates_due = 0.0
+        self.steps = 0
 
         # Always run the game
-        self.set_state(GameState.RUNNING)
+        self.game_state = GameState.RUNNING
+        self.runner.set_running(True)
 
     def handle_click(self, position):
         # Prioritize popup buttons
@@ -276,11 +384,14 @@ class Window:
                 return  # Only handle one button at a time
 
     def handle_mouse_hovers(self, buttons):
-        mouse = pygame.mouse.get_pos()
         for button in buttons:
-            if button.is_at_position(mouse):
+            if button.is_at_position(pygame.mouse.get_pos()):
                 button.do_hover()
 
+    def hovered_button(self, buttons):
+        mouse = pygame.mouse.get_pos()
+        return next((button for button in buttons if button.is_at_position(mouse)), None)
+
     def button(self, **kwargs):
         root = kwargs.get("root", self)
         kwargs["root"] = root  # Ensure it's set
@@ -288,14 +399,23 @@ class Window:
         kwargs["parent"] = parent  # Ensure it's set
         parent.buttons += [self.Button(**kwargs)]
 
-    def update(self):
-        if self.game_state == GameState.RUNNING or self.game_state == GameState.STEP:
-            if not self.game.finished():
-                self.waiting_from = None
-                list(self.game.update())
-            if self.game_state == GameState.STEP:
-                self.game_state = GameState.IDLE
-        if self.game.finished():
+    def update(self, dt):
+        """
+        Show the updates that were played in the background since the last call, and draw the window
+
+        :param dt: Time since the last update in seconds
+        :return: The rectangles of the window that changed
+        """
+        if self.game_state == GameState.RUNNING:
+            self.updates_due += dt * UPDATES_PER_SECOND[self.speed]
+            while self.updates_due >= 1 and self.next_frame():
+                self.updates_due -= 1
+            # don't catch up in a burst after waiting for a slow bot
+            self.updates_due = min(self.updates_due, 1)
+        while self.steps > 0 and self.next_frame():
+            self.steps -= 1
+
+        if self.frame.finished:
             self.game_state = GameState.FINISHED
 
             if self.presenting and self.waiting_from is None:
@@ -306,106 +426,101 @@ class Window:
                 self.waiting_from = None
                 self.restart_game([{'agent_id': 0}, {'agent_id': 1}])
 
-        self.window.fill(BLACK)
-        self.buttons = []  # This is so inefficient.
-
-        self.update_information()
-        self.draw_arena()
-
         if self.popup:
+            self.draw_arena()
+            self.draw_information()
             self.popup.buttons = []  # This is so inefficient.
             self.popup.draw()
             self.handle_mouse_hovers(self.popup.buttons)
-        else:
-            self.handle_mouse_hovers(self.buttons)
-
-    def sleep(self):
-        if self.speed == GameSpeed.SLOWER:
-            time.sleep(0.1)
-        else:
-            time.sleep(0.01)
+            # the popup covers the cached drawings, redraw everything once it closes
+            self.arena.cells = None
+            self.information_key = None
+            return [self.window.get_rect()]
+
+        return self.draw_arena() + self.draw_information()
+
+    def next_frame(self):
+        """
+        :return: Whether there was a new frame
+        """
+        frame = self.runner.get()
+        if frame is None:
+            return False
+        self.frame = frame
+        return True
+
+    def close(self):
+        self.stop_runner()
+        # a game of which a bot is still thinking after that is left out of the profiles
+        self.merge_profiles(timeout=1)
+
+    def game_profiler(self):
+        # every game gets its own profiler, since after a restart the runner of the previous game can still be in a move
+        return Profiler() if self.profiler is not None else None
+
+    def stop_runner(self):
+        self.runner.stop()
+        if self.profiler is not None:
+            self.stopped_runners.append(self.runner)
+            self.merge_profiles()
+
+    def merge_profiles(self, timeout=0):
+        """
+        Merge the profiles of the stopped games into `profiler`, once their bots are done
+
+        :param timeout: Seconds to wait for every runner that is still in a move of a bot
+        """
+        for runner in list(self.stopped_runners):
+            runner.thread.join(timeout)
+            if not runner.thread.is_alive():
+                self.profiler.merge(runner.game.profiler.results())
+                self.stopped_runners.remove(runner)
 
     def draw_arena(self):
-        tile_size = math.floor(min(self.window.get_size()) / self.game.grid_size[1])
-        body_size = math.floor(tile_size * 0.7)
-        body_tile_offset = (tile_size - body_size) / 2
-        candy_radius = int(tile_size * 0.6 / 2)
-        head_radius = int(tile_size * 0.9 / 2)
-        eye_radius = int(tile_size * 0.4 / 2)
-
-        def draw_snake(snake):
-            previous_pos = None
-            body_colour = COLOURS[snake.id] if not snake.dead else GRAY
-            for index, position in reversed(list(enumerate(snake))):
-                if index == 0:
-                    # Neck drawn first so head goes on top, as it should
-                    pygame.draw.line(self.window, body_colour,
-                                     (int((position[0] + 0.5) * tile_size),
-                                      self.height - (int((position[1] + 0.5) * tile_size))),
-                                     (int((previous_pos[0] + 0.5) * tile_size),
-                                      self.height - (int((previous_pos[1] + 0.5) * tile_size))),
-                                     body_size
-                                     )
-
-                    # Is head
-                    pygame.draw.circle(self.window, COLOURS[snake.id], (
-                        int((position[0] + 0.5) * tile_size),
-                        self.height - (int((position[1] + 0.5) * tile_size)),
-                    ), head_radius)
-
-                    # Draw eyes
-                    eye_offsets = [
-                        np.array([int(0.3 * tile_size), (int(-0.25 * tile_size))]),
-                        np.array([int(0.3 * tile_size), (int(0.25 * tile_size))])
-                    ]  # Assuming going right
-                    last_move_direction = position - snake[1]
-                    last_move_angle = math.atan2(last_move_direction[1], last_move_direction[0])
-                    for eye_offset in eye_offsets:
-                        corrected_eye_offset = self.rotate_vector(eye_offset, last_move_angle)
-                        pygame.draw.circle(self.window, WHITE, (
-                            int((position[0] + 0.5) * tile_size + corrected_eye_offset[0]),
-                            int((self.height - (position[1] + 0.5) * tile_size) - corrected_eye_offset[1]),
-                        ), eye_radius)
-                        corrected_eye_offset[np.argmax(np.abs(corrected_eye_offset))] *= 1.3
-                        pygame.draw.circle(self.window, BLACK, (
-                            int((position[0] + 0.5) * tile_size + corrected_eye_offset[0]),
-                            int(self.height - (int((position[1] + 0.5) * tile_size)) - corrected_eye_offset[1]),
-                        ), eye_radius // 2)
-
-                    previous_pos = position
-
-                else:
-                    # Is body
-                    if previous_pos is not None:
-                        pygame.draw.line(self.window, body_colour,
-                                         (int((position[0] + 0.5) * tile_size),
-                                          self.height - (int((position[1] + 0.5) * tile_size))),
-                                         (int((previous_pos[0] + 0.5) * tile_size),
-                                          self.height - (int((previous_pos[1] + 0.5) * tile_size))),
-                                         body_size
-                                         )
-                    pygame.draw.circle(self.window, body_colour, (
-                        int((position[0] + 0.5) * tile_size),
-                        self.height - (int((position[1] + 0.5) * tile_size)),
-                    ), (body_size // 2) - 1)  # Don't ask me why -1
-                    previous_pos = position
-
-        # Draw snake
-        for snake in self.game.dead_snakes: draw_snake(snake)
-        for snake in self.game.snakes: draw_snake(snake)
-
-        # Draw candies
-        scaled_cherry = pygame.transform.scale(self.cherry_image, (tile_size, tile_size))
-        for candy in self.game.candies:
-            self.window.blit(scaled_cherry, (
-                int((candy[0]) * tile_size),
-                self.height - (int((candy[1] + 1) * tile_size)),
-            ))
+        """
+        :return: The rectangles of the window that changed
+        """
+        return self.arena.draw(self.frame)
+
+    def draw_information(self):
+        """
+        Draw the scores and buttons next to the arena. They are drawn on a cached layer, which is only redrawn when the
+        text on it changes.
+
+        :return: The rectangles of the window that changed
+        """
+        frame = self.frame
+        information_key = ([agent.name for agent in self.game.agents.values()], frame.possible_scores, self.speed,
+                           self.presenting, self.multiplayer, None if self.multiplayer else self.cpu_times())
+        hovered = self.hovered_button(self.buttons)
+        changed = information_key != self.information_key
+        if changed:
+            self.information_key = information_key
+            self.information_layer.fill(BLACK)
+            self.buttons = []
+            self.update_information(self.information_layer)
+            hovered = self.hovered_button(self.buttons)
+        elif hovered is self.hovered:
+            return []
+
+        self.hovered = hovered
+        rect = pygame.Rect(self.height, 0, self.width - self.height, self.height)
+        self.window.blit(self.information_layer, rect, area=rect)
+        if hovered is not None:
+            hovered.do_hover()
+        return [rect]
+
+    def cpu_times(self):
+        """
+        :return: Map from agent id to the rounded average CPU time per turn in us
+        """
+        turns = self.frame.turns
+        return {index: round(cpu / turns * 1e6, 2) if turns > 0 else 0 for index, cpu in self.frame.cpu.items()}
 
     def start_bot_selection_popup(self, player):
         if self.multiplayer:
             return
-        self.game_state = GameState.IDLE
+        self.set_state(GameState.IDLE)
         self.popup = self.PlayerSelectionPopup(
             parent=self,
             root=self,
@@ -414,7 +529,7 @@ class Window:
             player=player,
         )
 
-    def update_information(self):
+    def update_information(self, surface):
         # Draw the information part
         left = self.height + self.border
         right = self.width - self.border
@@ -423,7 +538,7 @@ class Window:
 
         player_emblem_height = 60 if not self.multiplayer else 35
 
-        for score, index in self.game.possible_scores():
+        for score, index in self.frame.possible_scores:
             # for index, colour in enumerate([TEAM_A, TEAM_B]):
             # if index >= len(self.game.snakes): continue
             self.button(
@@ -432,30 +547,31 @@ class Window:
                 height=player_emblem_height,
                 background_colour=COLOURS[index],
                 disable_in_mp=True,
-                callback=lambda index=index: self.start_bot_selection_popup(index)
+                callback=lambda index=index: self.start_bot_selection_popup(index),
+                surface=surface,
             )
 
             # Draw Name
             text_to_render = self.game.agents[index].name
-            font = pygame.font.SysFont(None, 32)
+            font = system_font(32)
             text_size = font.size(text_to_render)
             text_object = font.render(text_to_render, True, WHITE)
-            self.window.blit(text_object, (left + self.border, top + self.border))
+            surface.blit(text_object, (left + self.border, top + self.border))
 
             if not self.multiplayer:
                 # Draw contributor
-                cpu_time = round(self.game.cpu[index] / self.game.turns * 1e6, 2) if self.game.turns > 0 else 0
+                cpu_time = self.cpu_times()[index]
                 text_to_render = f"{self.game.agents[index].contributor}  | CPU: {cpu_time} us"
-                font = pygame.font.SysFont(None, 26)
+                font = system_font(26)
                 text_object = font.render(text_to_render, True, WHITE)
-                self.window.blit(text_object, (left + self.border, top + self.border + text_size[1] + self.border))
+                surface.blit(text_object, (left + self.border, top + self.border + text_size[1] + self.border))
 
             # Draw score
-            font = pygame.font.SysFont(None, 68 if not self.multiplayer else 34)
+            font = system_font(68 if not self.multiplayer else 34)
             text_to_render = f"{score}"
             text_size = font.size(text_to_render)
             text_object = font.render(text_to_render, True, WHITE)
-            self.window.blit(text_object, (right - self.border - text_size[0], top + self.border))
+            surface.blit(text_object, (right - self.border - text_size[0], top + self.border))
 
             top += player_emblem_height + self.border
 
@@ -471,7 +587,8 @@ class Window:
             position=[button_left, button_top],
             width=button_width,
             height=button_height,
-            callback=lambda: self.set_state(GameState.RUNNING)
+            callback=lambda: self.set_state(GameState.RUNNING),
+            surface=surface,
         )
 
         button_left += button_width + self.border
@@ -480,7 +597,8 @@ class Window:
             position=[button_left, button_top],
             width=button_width,
             height=button_height,
-            callback=lambda: self.set_state(GameState.STEP)
+            callback=lambda: self.set_state(GameState.STEP),
+            surface=surface,
         )
 
         button_left += button_width + self.border
@@ -489,7 +607,8 @@ class Window:
             position=[button_left, button_top],
             width=button_width,
             height=button_height,
-            callback=lambda: self.set_state(GameState.IDLE)
+            callback=lambda: self.set_state(GameState.IDLE),
+            surface=surface,
         )
 
         button_left += button_width + self.border
@@ -498,7 +617,8 @@ class Window:
             position=[button_left, button_top],
             width=button_width,
             height=button_height,
-            callback=lambda: self.restart_game()
+            callback=lambda: self.restart_game(),
+            surface=surface,
         )
 
         button_left = left
@@ -509,7 +629,8 @@ class Window:
             width=button_width,
             height=button_height,
             background_colour=COLOURS[0],
-            callback=lambda: self.restart_game([{'agent_id': 0}])
+            callback=lambda: self.restart_game([{'agent_id': 0}]),
+            surface=surface,
         )
 
         button_left += button_width + self.border
@@ -519,7 +640,8 @@ class Window:
             width=button_width,
             height=button_height,
             background_colour=COLOURS[1],
-            callback=lambda: self.restart_game([{'agent_id': 1}])
+            callback=lambda: self.restart_game([{'agent_id': 1}]),
+            surface=surface,
         )
 
         button_left += button_width + self.border
@@ -528,7 +650,8 @@ class Window:
             position=[button_left, button_top],
             width=button_width,
             height=button_height,
-            callback=lambda s=self.speed: self.set_speed()
+            callback=lambda s=self.speed: self.set_speed(),
+            surface=surface,
         )
 
         button_left += button_width + self.border
@@ -537,7 +660,8 @@ class Window:
             position=[button_left, button_top],
             width=button_width,
             height=button_height,
-            callback=lambda s=self.speed: self.set_presenting()
+            callback=lambda s=self.speed: self.set_presenting(),
+            surface=surface,
         )
 
         button_left = left
@@ -547,10 +671,211 @@ class Window:
             position=[button_left, button_top],
             width=button_width,
             height=button_height,
-            callback=lambda s=self.speed: self.set_multiplayer()
+            callback=lambda s=self.speed: self.set_multiplayer(),
+            surface=surface,
         )
 
-    def rotate_vector(self, vector, angle):
-        x = vector[0] * math.cos(angle) - vector[1] * math.sin(angle)
-        y = vector[0] * math.sin(angle) + vector[1] * math.cos(angle)
-        return np.array([x, y])
+
+# playback speeds of the replay viewer in turns per second
+REPLAY_SPEEDS = [1, 2, 5, 10, 20, 50, 100, 200]
+
+
+class ReplayWindow:
+    """
+    Watch a replay, with scrubbing through the turns, variable playback speed and jumping to deaths
+
+    Seeking uses the keyframes of the replay, which are added when the replay does not have them, so it only
+    re-simulates the turns since the nearest keyframe.
+    """
+
+    def __init__(self, window, width, height, doc, keyframes=50):
+        from .game import Death
+        from .replay import ReplayReader, add_keyframes
+
+        self.window = window
+        self.width = width
+        self.height = height
+        self.border = 8
+        self.multiplayer = False  # for Window.Button
+
+        if not doc.get('keyframes'):
+            doc = add_keyframes(doc, keyframes)
+        self.doc = doc
+        self.reader = ReplayReader(doc)
+
+        # play the whole replay once, to find the deaths and the amount of turns
+        self.deaths = []  # list of (first turn in which the snake is dead, snake index)
+        for event in self.reader.all_events():
+            if isinstance(event, Death):
+                self.deaths.append((self.reader.state.turns + 1, event.snake.id))
+        self.total_turns = self.reader.state.turns
+
+        self.turn = 0
+        self.playing = False
+        self.speed = REPLAY_SPEEDS.index(10)
+        self.turns_due = 0.0
+        self.reader.seek(0)
+
+        pygame.font.init()
+        self.buttons = []
+        self.arena = ArenaRenderer(self.window, self.height, pygame.image.load("sprites/cherry.png"))
+        self.information_layer = pygame.Surface(self.window.get_size())
+        self.information_key = None
+        self.hovered = None
+
+        left = self.height + self.border
+        top = self.height - 3 * (30 + self.border) - 20
+        self.timeline = pygame.Rect(left, top, self.width - left - self.border, 20)
+
+    def seek(self, turn):
+        self.turn = max(0, min(turn, self.total_turns))
+        self.reader.seek(self.turn)
+        if self.turn == self.total_turns:
+            self.playing = False
+
+    def next_death(self):
+        turn = next((turns for turns, _ in self.deaths if turns > self.turn), None)
+        if turn is not None:
+            self.playing = False
+            self.seek(turn)
+
+    def previous_death(self):
+        turn = next((turns for turns, _ in reversed(self.deaths) if turns < self.turn), None)
+        if turn is not None:
+            self.playing = False
+            self.seek(turn)
+
+    def set_playing(self, playing=None):
+        self.playing = not self.playing if playing is None else playing
+        if self.playing and self.turn == self.total_turns:
+            self.seek(0)
+        self.turns_due = 0.0
+
+    def set_speed(self, change):
+        self.speed = max(0, min(self.speed + change, len(REPLAY_SPEEDS) - 1))
+
+    def handle_click(self, position):
+        if self.timeline.collidepoint(position):
+            self.seek(round((position[0] - self.timeline.left) / self.timeline.width * self.total_turns))
+            return
+        for button in self.buttons:
+            if button.is_at_position(position):
+                button.callback()
+                return  # Only handle one button at a time
+
+    def handle_key(self, key):
+        actions = {
+            pygame.K_SPACE: lambda: self.set_playing(),
+            pygame.K_LEFT: lambda: self.seek(self.turn - 1),
+            pygame.K_RIGHT: lambda: self.seek(self.turn + 1),
+            pygame.K_HOME: lambda: self.seek(0),
+            pygame.K_END: lambda: self.seek(self.total_turns),
+            pygame.K_UP: lambda: self.set_speed(1),
+            pygame.K_DOWN: lambda: self.set_speed(-1),
+            pygame.K_n: self.next_death,
+            pygame.K_p: self.previous_death,
+        }
+        if key in actions:
+            actions[key]()
+
+    def update(self, dt):
+        """
+        :param dt: Time since the last update in seconds
+        :return: The rectangles of the window that changed
+        """
+        if self.playing:
+            self.turns_due += dt * REPLAY_SPEEDS[self.speed]
+            if self.turns_due >= 1:
+                self.seek(self.turn + int(self.turns_due))
+                self.turns_due -= int(self.turns_due)
+        return self.arena.draw(self.reader.state) + self.draw_information()
+
+    def close(self):
+        pass
+
+    def draw_information(self):
+        """
+        Draw the players, timeline and buttons on a cached layer, which is only redrawn when they change
+
+        :return: The rectangles of the window that changed
+        """
+        state = self.reader.state
+        information_key = (self.turn, self.playing, self.speed, sorted(state.scores.items()),
+                           [None if s is None else len(s) for s in state.snakes])
+        hovered = next((b for b in self.buttons if b.is_at_position(pygame.mouse.get_pos())), None)
+        if information_key != self.information_key:
+            self.information_key = information_key
+            self.information_layer.fill(BLACK)
+            self.buttons = []
+            self.update_information(self.information_layer)
+            hovered = next((b for b in self.buttons if b.is_at_position(pygame.mouse.get_pos())), None)
+        elif hovered is self.hovered:
+            return []
+
+        self.hovered = hovered
+        rect = pygame.Rect(self.height, 0, self.width - self.height, self.height)
+        self.window.blit(self.information_layer, rect, area=rect)
+        if hovered is not None:
+            hovered.do_hover()
+        return [rect]
+
+    def update_information(self, surface):
+        state = self.reader.state
+        left = self.height + self.border
+        right = self.width - self.border
+        top = self.border
+
+        for index, name in enumerate(self.doc['agents']):
+            pygame.draw.rect(surface, COLOURS[index], (left, top, right - left, 50))
+            font = system_font(32)
+            surface.blit(font.render(name, True, WHITE), (left + self.border, top + self.border))
+            if index in state.scores:
+                text = f"rank {self.doc['rank'][index]}, score {state.scores[index]}"
+            else:
+                text = f"length {len(state.snakes[index])}"
+            text_size = font.size(text)
+            surface.blit(font.render(text, True, WHITE), (right - self.border - text_size[0], top + self.border))
+            top += 50 + self.border
+
+        font = system_font(32)
+        text = f"Turn {self.turn} / {self.total_turns}    {REPLAY_SPEEDS[self.speed]} turns/s"
+        surface.blit(font.render(text, True, WHITE), (left, self.timeline.top - 30))
+
+        # timeline, with a mark for every death
+        timeline = self.timeline
+        pygame.draw.rect(surface, BUTTON, timeline)
+        played = timeline.width * self.turn // max(self.total_turns, 1)
+        pygame.draw.rect(surface, WHITE, (timeline.left, timeline.top, played, timeline.height))
+        for turns, index in self.deaths:
+            x = timeline.left + timeline.width * turns // max(self.total_turns, 1)
+            pygame.draw.line(surface, COLOURS[index], (x, timeline.top - 4), (x, timeline.bottom + 4), 3)
+
+        rows = [
+            [("|<", lambda: self.seek(0)),
+             ("<", lambda: self.seek(self.turn - 1)),
+             ("Pause" if self.playing else "Play", lambda: self.set_playing()),
+             (">", lambda: self.seek(self.turn + 1)),
+             (">|", lambda: self.seek(self.total_turns))],
+            [("Prev death", self.previous_death),
+             ("Next death", self.next_death),
+             ("Slower", lambda: self.set_speed(-1)),
+             ("Faster", lambda: self.set_speed(1))],
+        ]
+        button_height = 30
+        button_top = self.height - self.border - len(rows) * (button_height + self.border)
+        for row in rows:
+            button_width = (right - left - (len(row) - 1) * self.border) // len(row)
+            button_left = left
+            for text, callback in row:
+                self.buttons.append(Window.Button(
+                    root=self,
+                    parent=self,
+                    text=text,
+                    position=[button_left, button_top],
+                    width=button_width,
+                    height=button_height,
+                    callback=callback,
+                    surface=surface,
+                ))
+                button_left += button_width + self.border
+            button_top += button_height + self.border
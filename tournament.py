@@ -10,34 +10,46 @@ import random
 import sys
 from argparse import ArgumentParser
 from datetime import datetime
+from functools import partial
 from itertools import combinations
-from math import inf
 from multiprocessing import Pool
 from tempfile import gettempdir
 
 import numpy as np
-import pandas
-import yaml
 
 from snakes.bots import bots
-from snakes.elo import print_tournament_summary
-from snakes.game import Game, RoundType, print_event
+from snakes.elo import PHASE_PREFIX, OnlineRating, print_phase_summary, print_tournament_summary
+from snakes.game import PHASES, Game, RoundType, describe_event, print_event
+from snakes.profiling import Profiler, report_profiles
+from snakes.replay import REPLAY_FORMATS, ReplayWriter, add_keyframes
 from snakes.utils import levenshtein_ratio
 
+REPLAY_EXTENSIONS = {'yaml': 'yml', 'jsonl': 'jsonl', 'binary': 'bin'}
+# amount of games after which the buffered replays are written to disk
+REPLAY_FLUSH_INTERVAL = 100
+
+
+def main(games, benchmark, jobs, leaderboard, keyframes, replay_format, profile, memory, phases):
+    # Only the main process writes summaries. Importing pandas here keeps the start-up of worker processes (which
+    # re-import this module when spawned) fast.
+    import pandas
 
-def main(games, benchmark, jobs):
     # write to a temporary file so that we have partial scores in case of a crash
     filename_base = f'snakes_{datetime.utcnow().strftime("%Y-%m-%d_%H-%M-%S")}'
     summary_filename = f'{filename_base}_summary.csv'
-    replay_filename = f'{filename_base}_replay.yml'
+    replay_filename = f'{filename_base}_replay.{REPLAY_EXTENSIONS[replay_format]}'
     with open(os.path.join(gettempdir(), summary_filename), 'w+') as f, \
-            open(os.path.join(gettempdir(), replay_filename), 'w+') as r:
+            ReplayWriter(os.path.join(gettempdir(), replay_filename), format=replay_format) as r:
         print(f'writing game results to {f.name}')
         writer = csv.writer(f)
         # write bot names
         names = [Bot(id=i, grid_size=(1, 1)).name for i, Bot in enumerate(bots)]
-        writer.writerow(names + ['turns', 'seed'] + ['cpu_' + name for name in names])
-        fieldnames = list(range(len(bots))) + ['turns', 'seed'] + ['cpu_' + name for name in names]
+        statistics = ['cpu_'] + (['mem_', 'peak_'] if memory else [])
+        statistic_columns = [prefix + name for prefix in statistics for name in names]
+        if phases:
+            statistic_columns += [PHASE_PREFIX + phase for phase in PHASES]
+        writer.writerow(names + ['turns', 'seed'] + statistic_columns)
+        fieldnames = list(range(len(bots))) + ['turns', 'seed'] + statistic_columns
         writer = csv.DictWriter(f, fieldnames=fieldnames)
 
         if benchmark:
@@ -67,13 +79,27 @@ def main(games, benchmark, jobs):
             pool = Pool(jobs if jobs else None)
             map_function = pool.imap_unordered
 
+        rating = OnlineRating(names)
+        profiler = Profiler() if profile else None
+
         n = 1
-        for row in map_function(single_game, match_list):
+        for row in map_function(partial(single_game, keyframes=keyframes, profile=profile, memory=memory,
+                                        phases=phases), match_list):
             replay = row.pop('replay')
-            yaml.safe_dump(replay, r, default_flow_style=True, width=inf, explicit_start=True)
+            if profile:
+                profiler.merge(row.pop('profile'))
+            r.write(replay, seed=row['seed'], turns=row['turns'])
+            if n % REPLAY_FLUSH_INTERVAL == 0:
+                r.flush()
             writer.writerow(row)
             f.flush()
             print(f'Progress: {100 * n / len(match_list):.1f}% [{n} / {len(match_list)}]')
+
+            rating.update({i: rank for i, rank in row.items() if isinstance(i, int)})
+            if leaderboard and n % leaderboard == 0:
+                print()
+                rating.print_leaderboard()
+                print()
             n += 1
 
         f.seek(0)
@@ -82,8 +108,16 @@ def main(games, benchmark, jobs):
         print()
         print_tournament_summary(df)
 
+        if phases:
+            print()
+            print_phase_summary(df)
+
+        if profile:
+            print()
+            report_profiles(profiler, filename_base)
+
 
-def single_game(match):
+def single_game(match, keyframes=0, profile=False, memory=False, phases=False):
     a, b, seed = match
     random.seed(seed)
     agents = {a: bots[a], b: bots[b]}
@@ -91,11 +125,17 @@ def single_game(match):
     print()
     print('Battle:', ' vs '.join(names))
     print()
-    game = Game(agents=agents, round_type=RoundType.TURNS)
+    profiler = Profiler() if profile else None
+    game = Game(agents=agents, round_type=RoundType.TURNS, profiler=profiler, track_memory=memory,
+                time_phases=phases)
+    # record the events like they are described when re-simulating the replay, where snakes are identified by index
+    indices = {snake.id: i for i, snake in enumerate(game.state.history.initial_snakes)}
+    events = []
     while True:
         for event in game.update():
             agent_names = {id: agent.name for id, agent in game.agents.items()}
             print_event(event, agent_names)
+            events.append(describe_event(event, game.turns, indices))
         if game.finished():
             break
     print()
@@ -109,7 +149,18 @@ def single_game(match):
     row['turns'] = game.turns
     row['seed'] = seed
     row['replay'] = game.save_replay()
+    row['replay']['turns'] = game.turns
+    row['replay']['events'] = events
+    if keyframes:
+        row['replay'] = add_keyframes(row['replay'], keyframes)
     row.update({'cpu_' + game.agents[i].name: cpu for i, cpu in game.cpu.items()})
+    if memory:
+        row.update({'mem_' + game.agents[i].name: retained for i, retained in game.memory.items()})
+        row.update({'peak_' + game.agents[i].name: peak for i, peak in game.memory_peak.items()})
+    if phases:
+        row.update({PHASE_PREFIX + phase: time for phase, time in game.phases.items()})
+    if profile:
+        row['profile'] = profiler.results()
     return row
 
 
@@ -118,6 +169,18 @@ if __name__ == '__main__':
     parser.add_argument('-g', '--games', default=10, type=int, help="Number of games to play")
     parser.add_argument('-b', '--benchmark', metavar='SNAKE', help='Benchmark 1 agent against all others')
     parser.add_argument('-j', '--jobs', default=0, type=int)
+    parser.add_argument('-l', '--leaderboard', metavar='N', default=0, type=int,
+                        help='Print a live leaderboard every N games')
+    parser.add_argument('-k', '--keyframes', metavar='N', default=0, type=int,
+                        help='Store a snapshot of the state every N turns in the replays, for fast seeking')
+    parser.add_argument('--replay-format', choices=REPLAY_FORMATS, default='yaml',
+                        help='File format of the replays, jsonl and binary are faster to write and read')
+    parser.add_argument('--profile', action='store_true',
+                        help='Profile the moves of every bot, and write a profile per bot and the latency of the moves')
+    parser.add_argument('--memory', action='store_true',
+                        help='Record the memory retained by every bot per game and allocated per move with tracemalloc')
+    parser.add_argument('--phases', action='store_true',
+                        help='Time the phases of the game engine, to compare the time of the engine and the bots')
     args = parser.parse_args()
 
     try:
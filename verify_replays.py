@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+# Copyright 2023 Nobleo Technology B.V.
+#
+# SPDX-License-Identifier: Apache-2.0
+
+import sys
+from argparse import ArgumentParser
+from multiprocessing import Pool
+
+from snakes.replay import ReplayArchive, verify_replay
+
+archive = None  # type: ReplayArchive | None
+
+
+def init_worker(path):
+    global archive
+    archive = ReplayArchive(path)
+
+
+def verify(i):
+    return i, verify_replay(archive[i])
+
+
+def main(match, jobs, game):
+    init_worker(match)
+    selection = game if game else range(len(archive))
+
+    if jobs == 1:
+        results = map(verify, selection)
+        pool = None
+    else:
+        pool = Pool(jobs if jobs else None, initializer=init_worker, initargs=(match,))
+        results = pool.imap_unordered(verify, selection, chunksize=16)
+
+    diverged = 0
+    for i, differences in sorted(results):
+        if differences:
+            diverged += 1
+            print(f'Replay {i} ({" vs ".join(archive.index[i]["agents"])}) diverged:')
+            for difference in differences:
+                print(f'  {difference}')
+    if pool is not None:
+        pool.close()
+
+    print(f'{diverged} of {len(selection)} replays diverged')
+    return diverged
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Re-simulate replays and check that they reproduce the recorded outcome')
+    parser.add_argument('match', help="Input match database")
+    parser.add_argument('-g', '--game', type=int, nargs='+', help="Index of the replays to verify")
+    parser.add_argument('-j', '--jobs', default=0, type=int)
+    args = parser.parse_args()
+
+    try:
+        sys.exit(1 if main(**vars(args)) else 0)
+    except KeyboardInterrupt:
+        pass
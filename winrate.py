@@ -10,39 +10,42 @@ import numpy as np
 import pandas as pd
 from matplotlib import pyplot as plt
 
-from snakes.elo import read_csv
-
-
-def print_winrate(df):
-    reserved_names = ['turns', 'seed']
-    names = [name for name in df.columns if name not in reserved_names and not name.startswith('cpu_')]
-    cpu_names = ['cpu_' + name for name in names]
-
-    ranking = df[names]  # contains only the individual match rankings
-
-    data = {
-        'Wins': (ranking == 1).sum(),
-        'Matches': ranking.notna().sum(),
-    }
-
-    data = pd.DataFrame(data)
+from snakes.bootstrap import bootstrap as resample, confidence_interval
+from snakes.elo import TournamentStats, read_csv
+
+
+def print_winrate(df, bootstrap=0, jobs=None):
+    """
+    :param df: The tournament results, a single DataFrame or an iterable of chunks
+    :param bootstrap: Amount of resamples for the confidence intervals, only supported for a single DataFrame
+    :param jobs: Amount of worker processes for the resampling
+    """
+    stats = TournamentStats.from_chunks([df] if isinstance(df, pd.DataFrame) else df)
+    names = stats.names
+    wins = pd.DataFrame(stats.pair_wins, index=names, columns=names)
+    draws = pd.DataFrame(stats.pair_draws, index=names, columns=names)
+
+    data = stats.to_frame()
     data['Rate'] = data['Wins'] / data['Matches']
     data.sort_values('Rate', inplace=True, ascending=False)
 
-    winrate = pd.DataFrame(np.full((len(names), len(names)), np.nan), index=data.index, columns=data.index)
-    for a in data.index:
-        for b in data.index:
-            if a == b:
-                continue
-            matches_participated = ranking[ranking[a].notna() & ranking[b].notna()]
-            won = (matches_participated[a] < matches_participated[b]).sum()
-            winrate[a][b] = won / len(matches_participated)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        winrate = wins / (wins + wins.T + draws)  # win rate of the row against the column bot
+    winrate = winrate.loc[data.index, data.index]
+
+    print(winrate.to_string(max_rows=np.inf, max_cols=np.inf))
 
-    print(winrate.T.to_string(max_rows=np.inf, max_cols=np.inf))
+    if bootstrap:
+        _, _, samples = resample(df[names], bootstrap, method=None, jobs=jobs)
+        for bound, matrix in zip(['Lower', 'Upper'], confidence_interval(samples)):
+            matrix = pd.DataFrame(matrix, index=names, columns=names).loc[data.index, data.index]
+            print()
+            print(f'{bound} bound of the 95% confidence interval')
+            print(matrix.to_string(max_rows=np.inf, max_cols=np.inf))
 
     fig = plt.figure()
     ax = fig.add_subplot(111)
-    cax = ax.matshow(winrate.T, interpolation='nearest')
+    cax = ax.matshow(winrate, interpolation='nearest')
     fig.colorbar(cax)
     ax.set_xticks(range(len(data.index)))
     ax.set_xticklabels(data.index, rotation=90)
@@ -51,15 +54,21 @@ def print_winrate(df):
     plt.show()
 
 
-def main(infile):
-    df = read_csv(infile)
-    print_winrate(df)
+def main(infile, bootstrap, jobs, chunksize):
+    df = read_csv(infile, chunksize=chunksize)
+    print_winrate(df, bootstrap, jobs)
 
 
 if __name__ == '__main__':
     parser = ArgumentParser(description='Elo estimation')
     parser.add_argument('infile', type=FileType(), help="Input csv")
+    parser.add_argument('-b', '--bootstrap', metavar='N', default=0, type=int,
+                        help="Amount of resamples for confidence intervals")
+    parser.add_argument('-j', '--jobs', type=int, help="Amount of worker processes for the resampling")
+    parser.add_argument('-c', '--chunksize', type=int, help="Read the input in chunks of this many matches")
     args = parser.parse_args()
+    if args.bootstrap and args.chunksize:
+        parser.error('--bootstrap needs all matches in memory, it can not be combined with --chunksize')
 
     try:
         main(**vars(args))